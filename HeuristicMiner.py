@@ -1,28 +1,311 @@
 from __future__ import annotations
-from PetriNet import PetriNet
+from PetriNet import PetriNet, ColumnarLog, Log, iter_traces, dependency_graph_file
+from heuristic import fitness_token_replay_models
 import pm4py
-from Painter import Painter
+from Painter import Painter, RenderWorker
 from pybeamline.sources import string_test_source, log_source
 from pybeamline.bevent import BEvent
 from pybeamline.mappers import sliding_window_to_log
 from reactivex import operators
+from reactivex.subject import Subject
 from reactivex.operators import window_with_count
 from math import ceil
-from typing import Dict, Tuple, Union, Set, List, Callable
+from datetime import datetime
+from typing import Dict, Tuple, Union, Set, List, Callable, Deque, FrozenSet, Iterable
 from copy import copy
+from collections import deque, OrderedDict
 import warnings
+import multiprocessing
+import queue
+import zlib
+import logging
+import os
+import time
 import json
 import pandas as pd
+import numpy as np
 
 warnings.filterwarnings("ignore")
 
+# the per-window dumps (depend dict, depend matrix, tasks) are logged at DEBUG
+logger = logging.getLogger(__name__)
+
+# share of the lossy counting budget left after an eviction pass
+BUDGET_LOW_WATER = 0.9
+
 
 class DcTuple:
-    def __init__(self, case_id: str, task_name: str, time_delta: int) -> None:
+    __slots__ = ("case_id", "task_name", "frequency", "time_delta", "last_time")
+
+    def __init__(
+        self, case_id: str, task_name: str, time_delta: int, last_time: float = 0.0
+    ) -> None:
+        """
+        last_time: time of the last event of the case (used by CaseTable)
+        """
         self.case_id = case_id
         self.task_name = task_name
         self.frequency = 1
         self.time_delta = time_delta
+        self.last_time = last_time
+
+
+class DcSet:
+    """
+    lossy counting set of the cases
+    case id -> last task of the case
+    """
+
+    def __init__(self) -> None:
+        self.counting_dict: Dict[str, DcTuple] = {}
+
+    def __len__(self) -> int:
+        return len(self.counting_dict)
+
+    def add_task(self, case_id: str, task_name: str, bucket: int) -> str | None:
+        """
+        update the last task of the case
+        return the former last task, or None if the case is new
+        """
+        if case_id not in self.counting_dict.keys():
+            self.counting_dict[case_id] = DcTuple(case_id, task_name, bucket - 1)
+            return None
+
+        dc_tuple = self.counting_dict[case_id]
+        last_task = dc_tuple.task_name
+        dc_tuple.task_name = task_name
+        dc_tuple.frequency += 1
+        return last_task
+
+    def get_counts(self) -> List[int]:
+        """
+        frequency + time_delta of every case (clean removes the lowest ones)
+        """
+        return [
+            dc_tuple.frequency + dc_tuple.time_delta
+            for dc_tuple in self.counting_dict.values()
+        ]
+
+    def clean(self, bucket: int) -> None:
+        for case_id in [
+            case_id
+            for case_id, dc_tuple in self.counting_dict.items()
+            if dc_tuple.frequency + dc_tuple.time_delta <= bucket
+        ]:
+            del self.counting_dict[case_id]
+
+
+class CaseTable:
+    """
+    last task of every live case, for event-at-a-time mining
+    at most max_case_num cases are kept (the least recently seen one is evicted),
+    and a case without events for more than ttl seconds is evicted
+    an evicted case that comes back has no last task, so every eviction
+    may lose one directly-follows relation
+    """
+
+    def __init__(self, max_case_num: int | None = None, ttl: float | None = None) -> None:
+        # least recently seen case first
+        self.case_dict: OrderedDict[str, DcTuple] = OrderedDict()
+        self.max_case_num = max_case_num
+        self.ttl = ttl
+        self.lru_eviction_num = 0
+        self.ttl_eviction_num = 0
+
+    def __len__(self) -> int:
+        return len(self.case_dict)
+
+    @property
+    def eviction_num(self) -> int:
+        return self.lru_eviction_num + self.ttl_eviction_num
+
+    def add_task(self, case_id: str, task_name: str, event_time: float) -> str | None:
+        """
+        update the last task of the case
+        return the former last task, or None if the case is new (or was evicted)
+        """
+        if self.ttl is not None:
+            self.evict_idle_cases(event_time)
+
+        dc_tuple = self.case_dict.get(case_id)
+        if dc_tuple is None:
+            if self.max_case_num is not None and len(self.case_dict) >= self.max_case_num:
+                self.case_dict.popitem(last=False)
+                self.lru_eviction_num += 1
+            self.case_dict[case_id] = DcTuple(case_id, task_name, 0, event_time)
+            return None
+
+        self.case_dict.move_to_end(case_id)
+        last_task = dc_tuple.task_name
+        dc_tuple.task_name = task_name
+        dc_tuple.frequency += 1
+        dc_tuple.last_time = event_time
+        return last_task
+
+    def evict_idle_cases(self, event_time: float) -> None:
+        while len(self.case_dict) > 0:
+            dc_tuple = next(iter(self.case_dict.values()))
+            if dc_tuple.last_time >= event_time - self.ttl:
+                return
+            del self.case_dict[dc_tuple.case_id]
+            self.ttl_eviction_num += 1
+
+
+class DrSet:
+    """
+    lossy counting set of the directly-follows relations
+    pred task -> succ task -> [frequency, time_delta]
+    """
+
+    def __init__(self) -> None:
+        self.counting_dict: Dict[str, Dict[str, List[int]]] = {}
+        self.relation_num = 0
+
+    def __len__(self) -> int:
+        return self.relation_num
+
+    def add_relation(self, pred_task: str, succ_task: str, bucket: int) -> None:
+        if pred_task not in self.counting_dict.keys():
+            self.counting_dict[pred_task] = {}
+        succ_dict = self.counting_dict[pred_task]
+        if succ_task not in succ_dict.keys():
+            succ_dict[succ_task] = [1, bucket - 1]
+            self.relation_num += 1
+        else:
+            succ_dict[succ_task][0] += 1
+
+    def get_counts(self) -> List[int]:
+        """
+        frequency + time_delta of every relation (clean removes the lowest ones)
+        """
+        return [
+            frequency + time_delta
+            for succ_dict in self.counting_dict.values()
+            for frequency, time_delta in succ_dict.values()
+        ]
+
+    def clean(self, bucket: int) -> None:
+        for pred_task in list(self.counting_dict.keys()):
+            succ_dict = self.counting_dict[pred_task]
+            for succ_task in list(succ_dict.keys()):
+                frequency, time_delta = succ_dict[succ_task]
+                if frequency + time_delta <= bucket:
+                    del succ_dict[succ_task]
+                    self.relation_num -= 1
+            if len(succ_dict) == 0:
+                del self.counting_dict[pred_task]
+
+    def get_depend_dict(self) -> Dict[str, Dict[str, int]]:
+        return {
+            pred_task: {
+                succ_task: tmp_tuple[0] for succ_task, tmp_tuple in succ_dict.items()
+            }
+            for pred_task, succ_dict in self.counting_dict.items()
+        }
+
+
+class SlidingWindow:
+    """
+    keep the directly-follows counts of the last window_size events
+    every new event costs O(1), instead of recounting the whole window
+    """
+
+    def __init__(self, window_size: int) -> None:
+        self.window_size = window_size
+        self.event_index = 0
+        # (event index, case id, task name), oldest first
+        self.event_queue: Deque[Tuple[int, str, str]] = deque()
+        # case id -> task names of the case inside the window
+        self.case_dict: Dict[str, Deque[str]] = {}
+        # task name -> event indexes of the task inside the window
+        self.task_index_dict: Dict[str, Deque[int]] = {}
+        self.depend_dict: Dict[str, Dict[str, int]] = {}
+
+    def is_full(self) -> bool:
+        return len(self.event_queue) == self.window_size
+
+    def add_event(
+        self, case_id: str, task_name: str, event_index: int | None = None
+    ) -> None:
+        """
+        event_index: index of the event in the whole stream (default: in this window),
+        used to order the tasks
+        """
+        if self.is_full():
+            self.remove_oldest_event()
+
+        if event_index is None:
+            event_index = self.event_index
+        self.event_queue.append((event_index, case_id, task_name))
+        if task_name not in self.task_index_dict.keys():
+            self.task_index_dict[task_name] = deque()
+        self.task_index_dict[task_name].append(event_index)
+        self.event_index += 1
+
+        if case_id not in self.case_dict.keys():
+            self.case_dict[case_id] = deque()
+        case_tasks = self.case_dict[case_id]
+        if len(case_tasks) > 0:
+            self.change_depend_frequency(case_tasks[-1], task_name, 1)
+        case_tasks.append(task_name)
+
+    def remove_events_before(self, event_index: int) -> None:
+        """
+        remove the events whose event_index (see add_event) is below event_index
+        """
+        while len(self.event_queue) > 0 and self.event_queue[0][0] < event_index:
+            self.remove_oldest_event()
+
+    def remove_oldest_event(self) -> None:
+        _, case_id, task_name = self.event_queue.popleft()
+
+        task_indexes = self.task_index_dict[task_name]
+        task_indexes.popleft()
+        if len(task_indexes) == 0:
+            del self.task_index_dict[task_name]
+
+        case_tasks = self.case_dict[case_id]
+        case_tasks.popleft()
+        if len(case_tasks) == 0:
+            del self.case_dict[case_id]
+        else:
+            self.change_depend_frequency(task_name, case_tasks[0], -1)
+
+    def change_depend_frequency(
+        self, pred_task: str, succ_task: str, delta: int
+    ) -> None:
+        if pred_task not in self.depend_dict.keys():
+            self.depend_dict[pred_task] = {}
+        succ_dict = self.depend_dict[pred_task]
+        succ_dict[succ_task] = succ_dict.get(succ_task, 0) + delta
+        if succ_dict[succ_task] == 0:
+            del succ_dict[succ_task]
+            if len(succ_dict) == 0:
+                del self.depend_dict[pred_task]
+
+    def get_task_names(self) -> List[str]:
+        """
+        task names ordered by their first occurrence in the window
+        """
+        return sorted(
+            self.task_index_dict.keys(),
+            key=lambda task_name: self.task_index_dict[task_name][0],
+        )
+
+    def get_depend_dict(self) -> Dict[str, Dict[str, int]]:
+        return {
+            pred_task: copy(succ_dict)
+            for pred_task, succ_dict in self.depend_dict.items()
+        }
+
+    def get_first_indexes(self) -> Dict[str, int]:
+        """
+        task name -> index of its first event in the window
+        """
+        return {
+            task_name: task_indexes[0]
+            for task_name, task_indexes in self.task_index_dict.items()
+        }
 
 
 class TaskNode:
@@ -31,27 +314,22 @@ class TaskNode:
         self.pred_task_set: Set[TaskNode] = set()
         self.succ_task_set: Set[TaskNode] = set()
 
-    def parse_depend_matrix(
-        self,
-        depend_matrix: Dict[str, Dict[str, float]],
-        threshold: float,
-        task_dict: Dict[str, TaskNode],
-    ) -> None:
-        self.pred_task_set: Set[TaskNode] = set()
-        self.succ_task_set: Set[TaskNode] = set()
-        for pred_task in depend_matrix.keys():
-            for succ_task in depend_matrix.keys():
-                if (
-                    pred_task == self.name
-                    and depend_matrix[pred_task][succ_task] >= threshold
-                ):
-                    self.succ_task_set.add(task_dict[succ_task])
 
-                if (
-                    succ_task == self.name
-                    and depend_matrix[pred_task][succ_task] >= threshold
-                ):
-                    self.pred_task_set.add(task_dict[pred_task])
+def parse_depend_matrix(
+    task_list: List[TaskNode], depend_matrix: np.ndarray, threshold: float
+) -> None:
+    """
+    fill the pred/succ sets of all tasks in one pass over the thresholded matrix
+    depend_matrix[i][j] is the dependency task_list[i] -> task_list[j]
+    """
+    for task in task_list:
+        task.pred_task_set = set()
+        task.succ_task_set = set()
+    for pred_index, succ_index in np.argwhere(depend_matrix >= threshold):
+        pred_task = task_list[pred_index]
+        succ_task = task_list[succ_index]
+        pred_task.succ_task_set.add(succ_task)
+        succ_task.pred_task_set.add(pred_task)
 
 
 class XOR_Relation:
@@ -61,130 +339,134 @@ class XOR_Relation:
             for succ_task in pred_task.succ_task_set:
                 self.relation_set_list.append((set([pred_task]), set([succ_task])))
 
-    def extend_one_relation(
-        self, threshold: float, get_dep_fre: Callable[[str, str], int]
-    ) -> bool:
-        """
-        extend one relation set
-        if success, return true
-        else return false
-        """
-
-        def is_new_pred_valid(
-            pred_task_set: Set[TaskNode],
-            succ_task_set: Set[TaskNode],
-            new_pred_task: TaskNode,
-        ) -> bool:
-            nonlocal get_dep_fre
-            nonlocal threshold
-
-            def is_ab_c_xor(a: TaskNode, b: TaskNode, c: TaskNode) -> bool:
-                """
-                is a xor b -> c valid?
-                """
-                nonlocal get_dep_fre
-                nonlocal threshold
-                tmp = (get_dep_fre(a.name, b.name) + get_dep_fre(b.name, a.name)) / (
-                    get_dep_fre(a.name, c.name) + get_dep_fre(b.name, c.name) + 1
-                )
-                if tmp < threshold:
-                    return True
-                else:
-                    return False
-
-            for pred_task in pred_task_set:
-                for succ_task in succ_task_set:
-                    if not is_ab_c_xor(pred_task, new_pred_task, succ_task):
-                        return False
-
-            return True
-
-        def is_new_succ_valid(
-            pred_task_set: Set[TaskNode],
-            succ_task_set: Set[TaskNode],
-            new_succ_task: TaskNode,
-        ) -> bool:
-            nonlocal get_dep_fre
-            nonlocal threshold
-
-            def is_a_bc_xor(a: TaskNode, b: TaskNode, c: TaskNode) -> bool:
-                """
-                is a -> b xor b valid?
-                """
-                nonlocal get_dep_fre
-                nonlocal threshold
-                tmp = (get_dep_fre(b.name, c.name) + get_dep_fre(c.name, b.name)) / (
-                    get_dep_fre(a.name, b.name) + get_dep_fre(a.name, c.name) + 1
-                )
-                if tmp < threshold:
-                    return True
-                else:
-                    return False
-
-            for pred_task in pred_task_set:
-                for succ_task in succ_task_set:
-                    if not is_a_bc_xor(pred_task, succ_task, new_succ_task):
-                        return False
-
-            return True
-
-        for relation in self.relation_set_list:
-            pred_task_set = relation[0]
-            succ_task_set = relation[1]
-
-            # print(f"{[x.name for x in pred_task_set], [x.name for x in succ_task_set]}")
-
-            common_succ_set: Set[TaskNode] = set()
-            for pred_task in pred_task_set:
-                tmp_succ_set = pred_task.succ_task_set
-                if common_succ_set == set():
-                    common_succ_set = copy(tmp_succ_set)
-                else:
-                    common_succ_set = common_succ_set.intersection(tmp_succ_set)
-
-            common_succ_set -= succ_task_set
-
-            for succ_task in common_succ_set:
-                if is_new_succ_valid(pred_task_set, succ_task_set, succ_task):
-                    succ_task_set.add(succ_task)
-                    return True
-
-            common_pred_set: Set[TaskNode] = set()
-            for succ_task in succ_task_set:
-                tmp_pred_set = succ_task.pred_task_set
-                if common_pred_set == set():
-                    common_pred_set = copy(tmp_pred_set)
-                else:
-                    common_pred_set = common_pred_set.intersection(tmp_pred_set)
-
-            common_pred_set -= pred_task_set
-
-            for pred_task in common_pred_set:
-                if is_new_pred_valid(pred_task_set, succ_task_set, pred_task):
-                    pred_task_set.add(pred_task)
-                    return True
-
-        return False
+    def extend_relations(
+        self,
+        threshold: float,
+        task_list: List[TaskNode],
+        depend_count_matrix: np.ndarray,
+        compared_scores: List[np.ndarray] | None = None,
+    ) -> int:
+        """
+        extend every relation set until no task can be added
+        the task sets are handled as bitsets of the task indexes
+        compared_scores: if given, every array of scores compared with threshold
+        is appended, another threshold with the same side of all of them gives
+        the same relations
+        return the number of added tasks
+        """
+        task_index_dict = {task: i for i, task in enumerate(task_list)}
+
+        def to_bitset(task_set: Set[TaskNode]) -> int:
+            bitset = 0
+            for task in task_set:
+                bitset |= 1 << task_index_dict[task]
+            return bitset
+
+        def to_index_list(bitset: int) -> List[int]:
+            index_list = []
+            while bitset:
+                lowest_bit = bitset & -bitset
+                index_list.append(lowest_bit.bit_length() - 1)
+                bitset ^= lowest_bit
+            return index_list
+
+        succ_bitset_list = [to_bitset(task.succ_task_set) for task in task_list]
+        pred_bitset_list = [to_bitset(task.pred_task_set) for task in task_list]
+        all_bitset = (1 << len(task_list)) - 1
+        # xor_matrix[a][b] = |a > b| + |b > a|
+        xor_matrix = depend_count_matrix + depend_count_matrix.T
+
+        def find_new_succ(pred_bitset: int, succ_bitset: int) -> int | None:
+            """
+            a -> b xor c is valid for every a in pred set, b in succ set
+            """
+            common_succ_bitset = all_bitset
+            for pred_index in to_index_list(pred_bitset):
+                common_succ_bitset &= succ_bitset_list[pred_index]
+            candidate_list = to_index_list(common_succ_bitset & ~succ_bitset)
+            if len(candidate_list) == 0:
+                return None
+            pred_list = to_index_list(pred_bitset)
+            succ_list = to_index_list(succ_bitset)
+            # axes: a, b, c
+            tmp = xor_matrix[np.ix_(succ_list, candidate_list)][np.newaxis, :, :] / (
+                depend_count_matrix[np.ix_(pred_list, succ_list)][:, :, np.newaxis]
+                + depend_count_matrix[np.ix_(pred_list, candidate_list)][
+                    :, np.newaxis, :
+                ]
+                + 1
+            )
+            if compared_scores is not None:
+                compared_scores.append(tmp.ravel())
+            valid_list = np.flatnonzero(np.all(tmp < threshold, axis=(0, 1)))
+            if len(valid_list) == 0:
+                return None
+            return candidate_list[valid_list[0]]
+
+        def find_new_pred(pred_bitset: int, succ_bitset: int) -> int | None:
+            """
+            a xor b -> c is valid for every a in pred set, c in succ set
+            """
+            common_pred_bitset = all_bitset
+            for succ_index in to_index_list(succ_bitset):
+                common_pred_bitset &= pred_bitset_list[succ_index]
+            candidate_list = to_index_list(common_pred_bitset & ~pred_bitset)
+            if len(candidate_list) == 0:
+                return None
+            pred_list = to_index_list(pred_bitset)
+            succ_list = to_index_list(succ_bitset)
+            # axes: a, c, b
+            tmp = xor_matrix[np.ix_(pred_list, candidate_list)][:, np.newaxis, :] / (
+                depend_count_matrix[np.ix_(pred_list, succ_list)][:, :, np.newaxis]
+                + depend_count_matrix[np.ix_(candidate_list, succ_list)].T[
+                    np.newaxis, :, :
+                ]
+                + 1
+            )
+            if compared_scores is not None:
+                compared_scores.append(tmp.ravel())
+            valid_list = np.flatnonzero(np.all(tmp < threshold, axis=(0, 1)))
+            if len(valid_list) == 0:
+                return None
+            return candidate_list[valid_list[0]]
+
+        extend_num = 0
+        for pred_task_set, succ_task_set in self.relation_set_list:
+            pred_bitset = to_bitset(pred_task_set)
+            succ_bitset = to_bitset(succ_task_set)
+            while True:
+                new_index = find_new_succ(pred_bitset, succ_bitset)
+                if new_index is not None:
+                    succ_bitset |= 1 << new_index
+                    succ_task_set.add(task_list[new_index])
+                    extend_num += 1
+                    continue
+                new_index = find_new_pred(pred_bitset, succ_bitset)
+                if new_index is not None:
+                    pred_bitset |= 1 << new_index
+                    pred_task_set.add(task_list[new_index])
+                    extend_num += 1
+                    continue
+                break
+
+        return extend_num
 
     def print(self) -> None:
         for relation in self.relation_set_list:
             print(f"{[x.name for x in relation[0]], [x.name for x in relation[1]]}")
 
     def remove_common_relation(self) -> None:
-        flag = True
-        while flag:
-            flag = False
-            relation_len = len(self.relation_set_list)
-            for i in range(relation_len):
-                for j in range(relation_len):
-                    if i == j:
-                        continue
-                    if self.relation_set_list[i] == self.relation_set_list[j]:
-                        flag = True
-                        del self.relation_set_list[j]
-                        break
-                if flag == True:
-                    break
+        """
+        keep the first one of the equal relations
+        """
+        relation_key_set: Set[Tuple[FrozenSet[TaskNode], FrozenSet[TaskNode]]] = set()
+        relation_set_list: List[Tuple[Set[TaskNode], Set[TaskNode]]] = []
+        for relation in self.relation_set_list:
+            relation_key = (frozenset(relation[0]), frozenset(relation[1]))
+            if relation_key not in relation_key_set:
+                relation_key_set.add(relation_key)
+                relation_set_list.append(relation)
+        self.relation_set_list = relation_set_list
 
 
 class IdGenerator:
@@ -196,21 +478,221 @@ class IdGenerator:
         return self.index
 
 
+class MinerMetrics:
+    """
+    per-window stage timings and counters of a HeuristicMiner
+    a window record is
+    {"window", "stages": {stage: seconds}, "total_seconds", "xor_extension_num",
+    "relation_num_before", "relation_num_after", "case_eviction_num",
+    "model_changed", "ingest_lag"}
+    case_eviction_num is the number of evicted cases so far (get_new_event only)
+    ingest_lag is now - the time of the last event of the window (seconds)
+    every record is given to callback, appended to jsonl_file (moved to
+    jsonl_file + ".1" when it is larger than max_file_size) and the last one
+    is written to prometheus_file (text exposition format)
+    only the window path is timed, adding an event costs nothing more
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[Dict], None] | None = None,
+        jsonl_file: str | None = None,
+        prometheus_file: str | None = None,
+        max_file_size: int = 10 * 2**20,
+    ) -> None:
+        self.callback = callback
+        self.jsonl_file = jsonl_file
+        self.prometheus_file = prometheus_file
+        self.max_file_size = max_file_size
+
+        self.window_num = 0
+        self.total_stage_seconds: Dict[str, float] = {}
+        self.record: Dict | None = None
+        self.lap_time = 0.0
+        self.start_time = 0.0
+        self.last_event_time: datetime | None = None
+
+    def start_window(self, last_event_time: datetime | None = None) -> None:
+        self.record = {
+            "window": self.window_num,
+            "stages": {},
+            "xor_extension_num": 0,
+            "relation_num_before": 0,
+            "relation_num_after": 0,
+            "case_eviction_num": 0,
+        }
+        self.last_event_time = last_event_time
+        self.start_time = time.perf_counter()
+        self.lap_time = self.start_time
+
+    def lap(self, stage: str) -> None:
+        """
+        the time since the last lap is spent in stage
+        """
+        if self.record is None:
+            return
+        now = time.perf_counter()
+        stages = self.record["stages"]
+        stages[stage] = stages.get(stage, 0.0) + now - self.lap_time
+        self.lap_time = now
+
+    def count(self, name: str, value: int) -> None:
+        if self.record is None:
+            return
+        self.record[name] += value
+
+    def end_window(self, model_changed: bool) -> None:
+        if self.record is None:
+            return
+        record = self.record
+        self.record = None
+        record["total_seconds"] = time.perf_counter() - self.start_time
+        record["model_changed"] = model_changed
+        if isinstance(self.last_event_time, datetime):
+            now = datetime.now(self.last_event_time.tzinfo)
+            record["ingest_lag"] = (now - self.last_event_time).total_seconds()
+        else:
+            record["ingest_lag"] = None
+        self.window_num += 1
+        for stage, seconds in record["stages"].items():
+            self.total_stage_seconds[stage] = (
+                self.total_stage_seconds.get(stage, 0.0) + seconds
+            )
+
+        if self.callback is not None:
+            self.callback(record)
+        if self.jsonl_file is not None:
+            self.write_jsonl(record)
+        if self.prometheus_file is not None:
+            self.write_prometheus(record)
+
+    def write_jsonl(self, record: Dict) -> None:
+        if (
+            os.path.exists(self.jsonl_file)
+            and os.path.getsize(self.jsonl_file) > self.max_file_size
+        ):
+            os.replace(self.jsonl_file, self.jsonl_file + ".1")
+        with open(self.jsonl_file, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def write_prometheus(self, record: Dict) -> None:
+        line_list = [
+            "# TYPE heuristic_miner_windows_total counter",
+            f"heuristic_miner_windows_total {self.window_num}",
+            "# TYPE heuristic_miner_stage_seconds gauge",
+        ]
+        for stage, seconds in record["stages"].items():
+            line_list.append(f'heuristic_miner_stage_seconds{{stage="{stage}"}} {seconds}')
+        line_list.append("# TYPE heuristic_miner_stage_seconds_total counter")
+        for stage, seconds in self.total_stage_seconds.items():
+            line_list.append(
+                f'heuristic_miner_stage_seconds_total{{stage="{stage}"}} {seconds}'
+            )
+        line_list.append("# TYPE heuristic_miner_window_seconds gauge")
+        line_list.append(f"heuristic_miner_window_seconds {record['total_seconds']}")
+        line_list.append("# TYPE heuristic_miner_xor_extensions gauge")
+        line_list.append(f"heuristic_miner_xor_extensions {record['xor_extension_num']}")
+        line_list.append("# TYPE heuristic_miner_relations gauge")
+        line_list.append(
+            f'heuristic_miner_relations{{phase="before"}} {record["relation_num_before"]}'
+        )
+        line_list.append(
+            f'heuristic_miner_relations{{phase="after"}} {record["relation_num_after"]}'
+        )
+        line_list.append("# TYPE heuristic_miner_case_evictions_total counter")
+        line_list.append(
+            f"heuristic_miner_case_evictions_total {record['case_eviction_num']}"
+        )
+        line_list.append("# TYPE heuristic_miner_model_changed gauge")
+        line_list.append(f"heuristic_miner_model_changed {int(record['model_changed'])}")
+        if record["ingest_lag"] is not None:
+            line_list.append("# TYPE heuristic_miner_ingest_lag_seconds gauge")
+            line_list.append(f"heuristic_miner_ingest_lag_seconds {record['ingest_lag']}")
+        # write then rename, a scraper never sees a half written file
+        with open(self.prometheus_file + ".tmp", "w") as f:
+            f.write("\n".join(line_list) + "\n")
+        os.replace(self.prometheus_file + ".tmp", self.prometheus_file)
+
+
 class HeuristicMiner:
     def __init__(
-        self, depend_threshold: float, xor_threshold: float, window_size: int
+        self,
+        depend_threshold: float,
+        xor_threshold: float,
+        window_size: int,
+        slide_size: int = 20,
+        error_bound: float = 0.001,
+        budget: int | None = None,
+        update_frequency: int | None = None,
+        metrics: MinerMetrics | None = None,
+        max_case_num: int | None = None,
+        case_ttl: float | None = None,
+        render_output_path: str = "result.png",
+        dot_path: str | None = None,
+        render_timeout: float = 30,
     ) -> None:
+        """
+        window_size and slide_size are used by the sliding window modes
+        error_bound, budget and update_frequency are used by the lossy counting mode:
+        the counts are at most error_bound * event number too low,
+        budget is the max number of cases + relations kept in memory,
+        over it the entries with the lowest counts are removed down to
+        BUDGET_LOW_WATER * budget,
+        the model is refreshed every update_frequency events (default: one bucket)
+        metrics: per-window stage timings and counters (None: not measured)
+        max_case_num and case_ttl (seconds of event time) bound the live cases
+        of the event-at-a-time mode, see CaseTable
+        render_output_path, dot_path (None: see find_dot_path) and render_timeout
+        (seconds) are passed to the RenderWorker of the pictures
+        """
         self.depend_threshold = depend_threshold
         self.xor_threshold = xor_threshold
         self.window_size = window_size
+        self.slide_size = slide_size
+
+        self.sliding_window = SlidingWindow(window_size)
+
+        self.bucket_width = ceil(1 / error_bound)
+        self.budget = budget
+        if update_frequency is None:
+            self.update_frequency = self.bucket_width
+        else:
+            self.update_frequency = update_frequency
+        self.dc_set = DcSet()
+        self.dr_set = DrSet()
+
+        self.case_table = CaseTable(max_case_num, case_ttl)
+        # directly-follows counts of the event-at-a-time mode,
+        # the tasks in order of first occurrence
+        self.event_task_dict: Dict[str, None] = {}
+        self.event_depend_dict: Dict[str, Dict[str, int]] = {}
+        self.event_num = 0
 
         self.counter = 1
 
-        self.depend_matrix: Dict[str, Dict[str, float]] | None = None
+        self.depend_matrix: np.ndarray | None = None
+
+        # fingerprint of the last shown model, the dot file and the picture
+        # are only regenerated when it changes
+        self.last_fingerprint: str | None = None
+        self.unchanged_model_num = 0
+        # emits ("model changed", fingerprint) or ("model unchanged", fingerprint)
+        # after every model refresh
+        self.model_events: Subject = Subject()
+        # the picture is rendered in the background, see RenderWorker
+        # (its thread is only started by the first picture)
+        self.render_worker = RenderWorker(
+            render_output_path, dot_path=dot_path, timeout=render_timeout
+        )
+        self.metrics = metrics
 
     def get_new_logs(self, logs: pd.DataFrame) -> None:
         if len(logs) != self.window_size:
             return
+        if self.metrics is not None:
+            self.metrics.start_window(
+                logs["time:timestamp"].iloc[-1] if "time:timestamp" in logs else None
+            )
 
         self.task_dict: Dict[str, TaskNode] = {}
         for task_name in logs["concept:name"].drop_duplicates():
@@ -228,21 +710,237 @@ class HeuristicMiner:
                     self.depend_dict[pred_task][succ_task] = dfg.graph[depend_relation]
                 else:
                     raise Exception
-        print(self.depend_dict)
+        self.lap("dfg")
+        logger.debug("depend dict: %s", self.depend_dict)
+
+        self.show_petriNet()
+
+    def get_new_window_event(self, event: BEvent) -> None:
+        """
+        streaming version of window_with_count(window_size, slide_size)
+        + get_new_logs, the window is updated event by event
+        """
+        self.sliding_window.add_event(event.get_trace_name(), event.get_event_name())
+        if not self.sliding_window.is_full():
+            return
+        if (self.sliding_window.event_index - self.window_size) % self.slide_size != 0:
+            return
+        if self.metrics is not None:
+            self.metrics.start_window(event.get_event_time())
+
+        self.task_dict = {}
+        for task_name in self.sliding_window.get_task_names():
+            self.task_dict[task_name] = TaskNode(task_name)
+        self.depend_dict = self.sliding_window.get_depend_dict()
+        self.lap("dfg")
+        logger.debug("depend dict: %s", self.depend_dict)
+
+        self.show_petriNet()
+
+    def get_new_lossy_event(self, event: BEvent) -> None:
+        """
+        lossy counting mode, the memory is bounded by
+        the error bound (or the budget) instead of a window
+        """
+        current_bucket = ceil(self.counter / self.bucket_width)
+        task_name = event.get_event_name()
+        last_task = self.dc_set.add_task(
+            event.get_trace_name(), task_name, current_bucket
+        )
+        if last_task is not None:
+            self.dr_set.add_relation(last_task, task_name, current_bucket)
+
+        if self.counter % self.bucket_width == 0:
+            self.dc_set.clean(current_bucket)
+            self.dr_set.clean(current_bucket)
+
+        if self.budget is not None and len(self.dc_set) + len(self.dr_set) > self.budget:
+            # one pass down to the low-water mark, the next passes are
+            # (1 - BUDGET_LOW_WATER) * budget new entries away
+            count_array = np.array(self.dc_set.get_counts() + self.dr_set.get_counts())
+            remove_num = len(count_array) - int(self.budget * BUDGET_LOW_WATER)
+            min_count = int(np.partition(count_array, remove_num - 1)[remove_num - 1])
+            self.dc_set.clean(min_count)
+            self.dr_set.clean(min_count)
+
+        if self.counter % self.update_frequency == 0:
+            if self.metrics is not None:
+                self.metrics.start_window(event.get_event_time())
+            self.task_dict = {}
+            for pred_task, succ_dict in self.dr_set.counting_dict.items():
+                for task_name in [pred_task, *succ_dict.keys()]:
+                    if task_name not in self.task_dict.keys():
+                        self.task_dict[task_name] = TaskNode(task_name)
+            self.depend_dict = self.dr_set.get_depend_dict()
+            self.lap("dfg")
+
+            self.show_petriNet()
+
+        self.counter += 1
+
+    def get_new_event(self, event: BEvent) -> None:
+        """
+        event-at-a-time mode: the directly-follows counts of the whole stream,
+        only the last task of every live case is kept (see CaseTable),
+        the model is refreshed every update_frequency events
+        """
+        task_name = event.get_event_name()
+        last_task = self.case_table.add_task(
+            event.get_trace_name(), task_name, event.get_event_time().timestamp()
+        )
+        if task_name not in self.event_task_dict.keys():
+            self.event_task_dict[task_name] = None
+        if last_task is not None:
+            if last_task not in self.event_depend_dict.keys():
+                self.event_depend_dict[last_task] = {}
+            succ_dict = self.event_depend_dict[last_task]
+            succ_dict[task_name] = succ_dict.get(task_name, 0) + 1
+        self.event_num += 1
+
+        if self.event_num % self.update_frequency == 0:
+            if self.metrics is not None:
+                self.metrics.start_window(event.get_event_time())
+                self.metrics.count("case_eviction_num", self.case_table.eviction_num)
+            self.task_dict = {}
+            for task_name in self.event_task_dict.keys():
+                self.task_dict[task_name] = TaskNode(task_name)
+            self.depend_dict = {
+                pred_task: copy(succ_dict)
+                for pred_task, succ_dict in self.event_depend_dict.items()
+            }
+            self.lap("dfg")
+            logger.debug(
+                "%d live cases, %d evicted", len(self.case_table), self.case_table.eviction_num
+            )
+
+            self.show_petriNet()
+
+    def load_log(self, log: Log | ColumnarLog) -> None:
+        """
+        use a whole log instead of a window:
+        the tasks in order of first occurrence and the directly-follows counts
+        """
+        if isinstance(log, ColumnarLog):
+            task_names: Iterable[str] = log.task_names
+        else:
+            task_names = dict.fromkeys(
+                event["concept:name"] for _, trace in iter_traces(log) for event in trace
+            )
+        self.task_dict = {}
+        for task_name in task_names:
+            self.task_dict[task_name] = TaskNode(task_name)
+        self.depend_dict = dependency_graph_file(log)
 
-        tmp_petriNet = self.generate_petriNet()
+    def sweep_thresholds(
+        self,
+        log: Log | ColumnarLog,
+        depend_thresholds: Iterable[float],
+        xor_thresholds: Iterable[float],
+        process_num: int = 1,
+    ) -> Tuple[pd.DataFrame, Dict[str, PetriNet]]:
+        """
+        mine a net for every (depend_threshold, xor_threshold) of the grid
+        and score it with fitness_token_replay on log
+        the log is counted once and the dependency matrix is computed once
+        for every dependency graph, the scores compared by the xor extension are
+        recorded, an xor threshold on the same side of all the scores of an
+        already built net shares that net
+        every distinct net is replayed once (process_num processes)
+        return (table of depend_threshold, xor_threshold, fingerprint, fitness,
+        the nets by fingerprint)
+        """
+        xor_threshold_list = list(xor_thresholds)
+        self.load_log(log)
+        self.update_depend_matrix()
+
+        # dependency graph -> [(sorted compared scores, number of scores below
+        # the xor threshold, fingerprint)] of the nets built for it
+        built_dict: Dict[bytes, List[Tuple[np.ndarray, int, str]]] = {}
+        petriNet_dict: Dict[str, PetriNet] = {}
+        row_list: List[Tuple[float, float, str]] = []
+        for depend_threshold in depend_thresholds:
+            graph_key = np.packbits(self.depend_matrix >= depend_threshold).tobytes()
+            built_list = built_dict.setdefault(graph_key, [])
+            for xor_threshold in xor_threshold_list:
+                # the same comparison results give the same net
+                for score_array, below_num, fingerprint in built_list:
+                    if np.searchsorted(score_array, xor_threshold) == below_num:
+                        break
+                else:
+                    compared_scores: List[np.ndarray] = []
+                    petriNet = self.build_petriNet(
+                        depend_threshold, xor_threshold, compared_scores
+                    )
+                    fingerprint = petriNet.freeze().fingerprint()
+                    score_array = np.sort(
+                        np.concatenate(compared_scores)
+                        if len(compared_scores) > 0
+                        else np.empty(0)
+                    )
+                    built_list.append(
+                        (
+                            score_array,
+                            int(np.searchsorted(score_array, xor_threshold)),
+                            fingerprint,
+                        )
+                    )
+                    petriNet_dict.setdefault(fingerprint, petriNet)
+                row_list.append((depend_threshold, xor_threshold, fingerprint))
+
+        fingerprint_list = list(petriNet_dict.keys())
+        fitness_list = fitness_token_replay_models(
+            log, [petriNet_dict[x] for x in fingerprint_list], process_num
+        )
+        fitness_dict = dict(zip(fingerprint_list, fitness_list))
+        return (
+            pd.DataFrame(
+                [(*row, fitness_dict[row[2]]) for row in row_list],
+                columns=["depend_threshold", "xor_threshold", "fingerprint", "fitness"],
+            ),
+            petriNet_dict,
+        )
+
+    def show_petriNet(self) -> bool:
+        """
+        return False (and skip the painting) if the model is the same as last time
+        """
+        tmp_petriNet = self.generate_petriNet().freeze()
+        fingerprint = tmp_petriNet.fingerprint()
+        self.lap("fingerprint")
+        if fingerprint == self.last_fingerprint:
+            self.unchanged_model_num += 1
+            self.model_events.on_next(("model unchanged", fingerprint))
+            if self.metrics is not None:
+                self.metrics.end_window(False)
+            return False
+        self.last_fingerprint = fingerprint
         tmp_painter = Painter()
         tmp_painter.generate_dot_code(tmp_petriNet)
-        tmp_painter.generate_graph_show(False)
+        self.render_worker.submit(tmp_painter.dot_code)
+        self.lap("painter")
+        self.model_events.on_next(("model changed", fingerprint))
+        if self.metrics is not None:
+            self.metrics.end_window(True)
+        return True
+
+    def lap(self, stage: str) -> None:
+        if self.metrics is not None:
+            self.metrics.lap(stage)
+
+    def close(self) -> None:
+        """
+        wait for the last picture and stop the render worker
+        """
+        self.render_worker.close()
 
     def print_set(self) -> None:
-        # print("---dc---")
-        # for case_id in self.dc_set.counting_dict.keys():
-        #     dc_tuple = self.dc_set.counting_dict[case_id]
-        #     print(case_id)
-        #     print(f" {dc_tuple.task_name} f:{dc_tuple.frequency} {dc_tuple.time_delta}")
-        #     print()
-        # print()
+        print("---dc---")
+        for case_id in self.dc_set.counting_dict.keys():
+            dc_tuple = self.dc_set.counting_dict[case_id]
+            print(case_id)
+            print(f" {dc_tuple.task_name} f:{dc_tuple.frequency} {dc_tuple.time_delta}")
+            print()
+        print()
         print("---dr---")
         for pred_task in self.dr_set.counting_dict.keys():
             tmp_dict = self.dr_set.counting_dict[pred_task]
@@ -253,63 +951,96 @@ class HeuristicMiner:
                 print()
 
     def print_tasks(self) -> None:
+        print(self.format_tasks())
+
+    def format_tasks(self) -> str:
+        line_list: List[str] = []
         for task_name in self.task_dict.keys():
-            print(task_name)
-            print(f" pred: {[x.name for x in self.task_dict[task_name].pred_task_set]}")
-            print(f" succ: {[x.name for x in self.task_dict[task_name].succ_task_set]}")
-        print()
+            line_list.append(task_name)
+            line_list.append(
+                f" pred: {[x.name for x in self.task_dict[task_name].pred_task_set]}"
+            )
+            line_list.append(
+                f" succ: {[x.name for x in self.task_dict[task_name].succ_task_set]}"
+            )
+        return "\n".join(line_list) + "\n"
 
-    def generate_petriNet(self) -> PetriNet:
-        def get_depend_frequency(pred_task: str, succ_task: str) -> int:
-            nonlocal self
-            dr_dict = self.depend_dict
-            if pred_task not in dr_dict.keys():
-                return 0
-            elif succ_task not in dr_dict[pred_task].keys():
-                return 0
-            else:
-                return dr_dict[pred_task][succ_task]
-
-        self.depend_matrix = {}
-        # get dependency matrix
-        for pred_task in self.task_dict.keys():
-            self.depend_matrix[pred_task] = {}
-            for succ_task in self.task_dict.keys():
-                if pred_task != succ_task:
-                    pred2succ = get_depend_frequency(pred_task, succ_task)
-                    succ2pred = get_depend_frequency(succ_task, pred_task)
-                    self.depend_matrix[pred_task][succ_task] = (
-                        pred2succ - succ2pred
-                    ) / (pred2succ + succ2pred + 1)
-                else:
-                    tmp = get_depend_frequency(pred_task, succ_task)
-                    self.depend_matrix[pred_task][succ_task] = tmp / (tmp + 1)
+    def print_depend_matrix(self) -> None:
+        print(self.format_depend_matrix())
 
-        for pred_task in self.task_dict.keys():
-            print(pred_task)
-            for succ_task in self.task_dict.keys():
-                print(f" {succ_task} {self.depend_matrix[pred_task][succ_task]}")
+    def format_depend_matrix(self) -> str:
+        line_list: List[str] = []
+        for i, pred_task in enumerate(self.task_dict.keys()):
+            line_list.append(pred_task)
+            for j, succ_task in enumerate(self.task_dict.keys()):
+                line_list.append(f" {succ_task} {self.depend_matrix[i][j]}")
+        return "\n".join(line_list)
 
-        for task_name in self.task_dict.keys():
-            self.task_dict[task_name].parse_depend_matrix(
-                self.depend_matrix, self.depend_threshold, self.task_dict
-            )
+    def generate_petriNet(self) -> PetriNet:
+        self.update_depend_matrix()
+        petriNet = self.build_petriNet(self.depend_threshold, self.xor_threshold)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("tasks:\n%s", self.format_tasks())
+            self.lap("diagnostics")
+        return petriNet
+
+    def update_depend_matrix(self) -> None:
+        """
+        fill depend_count_matrix and depend_matrix from task_dict and depend_dict
+        """
+        # get dependency matrix, the tasks are indexed by their order in task_dict
+        task_list = list(self.task_dict.values())
+        task_index_dict = {task_name: i for i, task_name in enumerate(self.task_dict)}
+        self.depend_count_matrix = np.zeros((len(task_list), len(task_list)))
+        for pred_task, succ_dict in self.depend_dict.items():
+            for succ_task, frequency in succ_dict.items():
+                self.depend_count_matrix[
+                    task_index_dict[pred_task], task_index_dict[succ_task]
+                ] = frequency
+
+        pred2succ = self.depend_count_matrix
+        succ2pred = self.depend_count_matrix.T
+        self.depend_matrix = (pred2succ - succ2pred) / (pred2succ + succ2pred + 1)
+        loop_frequency = np.diagonal(pred2succ)
+        np.fill_diagonal(self.depend_matrix, loop_frequency / (loop_frequency + 1))
+
+        self.lap("depend_matrix")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("depend matrix:\n%s", self.format_depend_matrix())
+            self.lap("diagnostics")
+
+    def build_petriNet(
+        self,
+        depend_threshold: float,
+        xor_threshold: float,
+        compared_scores: List[np.ndarray] | None = None,
+    ) -> PetriNet:
+        """
+        build the net from the current depend_matrix (see update_depend_matrix)
+        compared_scores: see XOR_Relation.extend_relations
+        """
+        task_list = list(self.task_dict.values())
+        parse_depend_matrix(task_list, self.depend_matrix, depend_threshold)
 
         # self.print_tasks()
 
         xor_relations = XOR_Relation(self.task_dict)
         # xor_relations.print()
         # print()
-        while xor_relations.extend_one_relation(
-            self.xor_threshold, get_depend_frequency
-        ):
-            None
-            # xor_relations.print()
-            # print()
-
-        self.print_tasks()
+        extend_num = xor_relations.extend_relations(
+            xor_threshold, task_list, self.depend_count_matrix, compared_scores
+        )
+        # xor_relations.print()
+        # print()
+        self.lap("xor_extension")
 
+        relation_num = len(xor_relations.relation_set_list)
         xor_relations.remove_common_relation()
+        self.lap("remove_common_relation")
+        if self.metrics is not None:
+            self.metrics.count("xor_extension_num", extend_num)
+            self.metrics.count("relation_num_before", relation_num)
+            self.metrics.count("relation_num_after", len(xor_relations.relation_set_list))
 
         # xor_relations.print()
 
@@ -360,10 +1091,278 @@ class HeuristicMiner:
                 petriNet.add_edge(
                     petriNet.transition_name_to_id(task.name), end_place_id
                 )
+        self.lap("petri_net")
 
         return petriNet
 
 
+def run_count_shard(
+    shard_index: int,
+    window_size: int,
+    input_queue: multiprocessing.Queue,
+    output_queue: multiprocessing.Queue,
+) -> None:
+    """
+    worker process of ShardedHeuristicMiner, input messages:
+    ("events", event indexes, case ids, task names, window start),
+    ("snapshot", window start), ("stop",)
+    the events before window start (an index of the whole stream) are removed,
+    a snapshot is answered with (shard_index, first indexes, depend dict)
+    """
+    sliding_window = SlidingWindow(window_size)
+    while True:
+        message = input_queue.get()
+        if message[0] == "events":
+            _, index_list, case_id_list, task_name_list, window_start = message
+            for event_index, case_id, task_name in zip(
+                index_list, case_id_list, task_name_list
+            ):
+                sliding_window.add_event(case_id, task_name, event_index)
+            sliding_window.remove_events_before(window_start)
+        elif message[0] == "snapshot":
+            sliding_window.remove_events_before(message[1])
+            output_queue.put(
+                (
+                    shard_index,
+                    sliding_window.get_first_indexes(),
+                    sliding_window.get_depend_dict(),
+                )
+            )
+        elif message[0] == "stop":
+            return
+        else:
+            raise Exception
+
+
+class ShardedHeuristicMiner:
+    """
+    case-partitioned version of HeuristicMiner.get_new_window_event
+    the events are hashed by case id onto shard_num worker processes, every worker
+    counts the directly-follows relations of its events among the last
+    window_size events of the whole stream (the start of the window is sent
+    with every batch): a case never spans two shards, so the partial counts add
+    up to the counts of get_new_window_event with slide_size = merge_frequency
+    every merge_frequency events the partial counts are merged and miner
+    builds and shows the model
+    the events are sent to the workers in batches of batch_size,
+    get_new_events takes the events as columns and hashes them in bulk
+    merge() raises RuntimeError if a worker died, TimeoutError if the workers
+    do not answer within merge_timeout seconds (None: no limit)
+    """
+
+    def __init__(
+        self,
+        miner: HeuristicMiner,
+        shard_num: int = 2,
+        merge_frequency: int = 1000,
+        batch_size: int = 256,
+        merge_timeout: float | None = None,
+    ) -> None:
+        self.miner = miner
+        self.shard_num = shard_num
+        self.merge_frequency = merge_frequency
+        self.batch_size = batch_size
+        self.merge_timeout = merge_timeout
+        self.event_index = 0
+        self.merge_num = 0
+
+        # per shard: (event indexes, case ids, task names) of the unsent events
+        self.batch_list: List[Tuple[List[int], List[str], List[str]]] = [
+            ([], [], []) for _ in range(shard_num)
+        ]
+        self.input_queue_list = [multiprocessing.Queue() for _ in range(shard_num)]
+        self.output_queue: multiprocessing.Queue = multiprocessing.Queue()
+        self.process_list = [
+            multiprocessing.Process(
+                target=run_count_shard,
+                args=(
+                    i,
+                    miner.window_size,
+                    self.input_queue_list[i],
+                    self.output_queue,
+                ),
+                daemon=True,
+            )
+            for i in range(shard_num)
+        ]
+        for process in self.process_list:
+            process.start()
+
+    def get_shard(self, case_id: str) -> int:
+        # crc32 instead of hash(): the same case goes to the same shard in every run
+        return zlib.crc32(case_id.encode()) % self.shard_num
+
+    def get_new_window_event(self, event: BEvent) -> None:
+        case_id = event.get_trace_name()
+        shard_index = self.get_shard(case_id)
+        index_list, case_id_list, task_name_list = self.batch_list[shard_index]
+        index_list.append(self.event_index)
+        case_id_list.append(case_id)
+        task_name_list.append(event.get_event_name())
+        self.event_index += 1
+        if len(index_list) >= self.batch_size:
+            self.flush(shard_index)
+
+        if self.event_index < self.miner.window_size:
+            return
+        if (self.event_index - self.miner.window_size) % self.merge_frequency != 0:
+            return
+        if self.miner.metrics is not None:
+            self.miner.metrics.start_window(event.get_event_time())
+        self.merge()
+        self.miner.show_petriNet()
+
+    def get_new_events(
+        self,
+        case_ids: List[str],
+        task_names: List[str],
+        event_times: List[datetime] | None = None,
+    ) -> None:
+        """
+        same as get_new_window_event on every event, the events are given as columns:
+        the events up to the next merge are hashed in bulk (crc32 once per case)
+        and sent to every shard as one batch
+        """
+        event_num = len(case_ids)
+        start = 0
+        while start < event_num:
+            end = min(event_num, start + self.get_next_merge_index() - self.event_index)
+            segment_case_ids = case_ids[start:end]
+            shard_dict = {
+                case_id: self.get_shard(case_id) for case_id in set(segment_case_ids)
+            }
+            shard_indexes = np.fromiter(
+                map(shard_dict.__getitem__, segment_case_ids),
+                dtype=np.int64,
+                count=end - start,
+            )
+            case_id_array = np.array(segment_case_ids, dtype=object)
+            task_name_array = np.array(task_names[start:end], dtype=object)
+            positions = np.argsort(shard_indexes, kind="stable")
+            shard_offsets = np.searchsorted(
+                shard_indexes[positions], np.arange(self.shard_num + 1)
+            )
+            window_start = self.event_index + end - start - self.miner.window_size
+            for shard_index in range(self.shard_num):
+                shard_positions = positions[
+                    shard_offsets[shard_index] : shard_offsets[shard_index + 1]
+                ]
+                if len(shard_positions) == 0:
+                    continue
+                # the single events of get_new_window_event go first
+                self.flush(shard_index)
+                self.input_queue_list[shard_index].put(
+                    (
+                        "events",
+                        (shard_positions + self.event_index).tolist(),
+                        case_id_array[shard_positions].tolist(),
+                        task_name_array[shard_positions].tolist(),
+                        window_start,
+                    )
+                )
+            self.event_index += end - start
+            start = end
+
+            if self.event_index < self.miner.window_size:
+                continue
+            if (self.event_index - self.miner.window_size) % self.merge_frequency != 0:
+                continue
+            if self.miner.metrics is not None:
+                self.miner.metrics.start_window(
+                    event_times[end - 1] if event_times is not None else None
+                )
+            self.merge()
+            self.miner.show_petriNet()
+
+    def get_window_start(self) -> int:
+        return self.event_index - self.miner.window_size
+
+    def get_next_merge_index(self) -> int:
+        """
+        the first event_index after the current one at which a merge is due
+        """
+        if self.event_index < self.miner.window_size:
+            return self.miner.window_size
+        return (
+            self.event_index
+            + self.merge_frequency
+            - (self.event_index - self.miner.window_size) % self.merge_frequency
+        )
+
+    def flush(self, shard_index: int) -> None:
+        if len(self.batch_list[shard_index][0]) > 0:
+            self.input_queue_list[shard_index].put(
+                ("events", *self.batch_list[shard_index], self.get_window_start())
+            )
+            self.batch_list[shard_index] = ([], [], [])
+
+    def get_snapshot(self) -> Tuple[int, Dict[str, int], Dict[str, Dict[str, int]]]:
+        """
+        wait for the answer of a worker, checking every second that all are alive
+        """
+        start_time = time.perf_counter()
+        while True:
+            try:
+                return self.output_queue.get(timeout=1)
+            except queue.Empty:
+                pass
+            for process in self.process_list:
+                if not process.is_alive():
+                    raise RuntimeError(
+                        f"shard worker {process.name} exited with code {process.exitcode}"
+                    )
+            if (
+                self.merge_timeout is not None
+                and time.perf_counter() - start_time > self.merge_timeout
+            ):
+                raise TimeoutError(
+                    f"shard workers did not answer within {self.merge_timeout} s"
+                )
+
+    def merge(self) -> None:
+        """
+        add up the counts of all shards into miner.task_dict / miner.depend_dict,
+        the tasks are ordered by their first event like in SlidingWindow
+        """
+        for shard_index in range(self.shard_num):
+            self.flush(shard_index)
+            self.input_queue_list[shard_index].put(("snapshot", self.get_window_start()))
+
+        first_index_dict: Dict[str, int] = {}
+        depend_dict: Dict[str, Dict[str, int]] = {}
+        for _ in range(self.shard_num):
+            _, shard_first_index_dict, shard_depend_dict = self.get_snapshot()
+            for task_name, first_index in shard_first_index_dict.items():
+                if first_index < first_index_dict.get(task_name, first_index + 1):
+                    first_index_dict[task_name] = first_index
+            for pred_task, succ_dict in shard_depend_dict.items():
+                if pred_task not in depend_dict.keys():
+                    depend_dict[pred_task] = {}
+                merged_succ_dict = depend_dict[pred_task]
+                for succ_task, frequency in succ_dict.items():
+                    merged_succ_dict[succ_task] = (
+                        merged_succ_dict.get(succ_task, 0) + frequency
+                    )
+
+        self.miner.task_dict = {}
+        for task_name in sorted(first_index_dict.keys(), key=first_index_dict.get):
+            self.miner.task_dict[task_name] = TaskNode(task_name)
+        self.miner.depend_dict = depend_dict
+        self.merge_num += 1
+        self.miner.lap("dfg")
+        logger.debug("depend dict: %s", depend_dict)
+
+    def close(self) -> None:
+        """
+        stop the workers and the render worker of miner
+        """
+        for input_queue in self.input_queue_list:
+            input_queue.put(("stop",))
+        for process in self.process_list:
+            process.join()
+        self.miner.close()
+
+
 def mine(logs: pd.DataFrame):
     tasks = logs["concept:name"].drop_duplicates()
 
@@ -387,10 +1386,19 @@ if __name__ == "__main__":
     #     operators.take(4500), window_with_count(4500, None), sliding_window_to_log()
     # ).subscribe(mine)
 
-    miner = HeuristicMiner(0.9605, 0.8, 4200)
-    b_events_windows = b_events.pipe(
-        window_with_count(4200, 20), sliding_window_to_log()
-    ).subscribe(miner.get_new_logs)
+    # level=logging.DEBUG dumps the depend dict / matrix and the tasks of every window
+    logging.basicConfig(level=logging.INFO)
+    miner = HeuristicMiner(0.9605, 0.8, 4200, 20)
+    b_events.subscribe(miner.get_new_window_event)
+    miner.close()
+    print(miner.render_worker.get_stats())
+
+    # b_events_windows = b_events.pipe(
+    #     window_with_count(4200, 20), sliding_window_to_log()
+    # ).subscribe(miner.get_new_logs)
+
+    # miner = HeuristicMiner(0.9605, 0.8, 4200, update_frequency=500, max_case_num=1000)
+    # b_events.subscribe(miner.get_new_event)
 
     # traces_list = []
 
@@ -425,8 +1433,8 @@ if __name__ == "__main__":
 
     # # b_events = b_events.pipe(operators.take(5))
 
-    # miner = HeuristicMiner(0.000000002, 0.9605, 0.8)
-    # b_events.subscribe(lambda x: miner.get_new_event(x))
+    # miner = HeuristicMiner(0.9605, 0.8, 4200, error_bound=0.000000002)
+    # b_events.subscribe(lambda x: miner.get_new_lossy_event(x))
 
     # # for pred_task in miner.dr_set.counting_dict.keys():
     # #     tmp_dict = miner.dr_set.counting_dict[pred_task]
@@ -0,0 +1,247 @@
+from __future__ import annotations
+from typing import List, Dict, Tuple, Union
+import argparse
+import random
+import time
+import numpy as np
+from PetriNet import ColumnarLog, write_xes
+
+# a block is an activity index or (operator, child blocks)
+# "loop" has two children: (body, redo), the others have two or more
+Block = Union[int, Tuple[str, List["Block"]]]
+OPERATORS = ["sequence", "xor", "and", "loop"]
+
+
+class LogGenerator:
+    """
+    seeded random block-structured process model and its simulation
+    every trace is simulated if pool_size is None, otherwise the traces are
+    drawn from a pool of pool_size simulated traces: much faster, but the log
+    has at most pool_size clean variants (too few to measure variant sharing)
+    a trace is noisy with probability noise_rate: one event is removed,
+    swapped with the next one or a random activity is inserted
+    """
+
+    def __init__(
+        self,
+        activity_num: int,
+        seed: int = 0,
+        noise_rate: float = 0.0,
+        operator_weights: Dict[str, float] | None = None,
+        max_children: int = 4,
+        loop_probability: float = 0.3,
+        pool_size: int | None = None,
+    ) -> None:
+        self.activity_num = activity_num
+        self.seed = seed
+        self.noise_rate = noise_rate
+        if operator_weights is None:
+            operator_weights = {"sequence": 0.4, "xor": 0.3, "and": 0.2, "loop": 0.1}
+        self.operator_weights = operator_weights
+        self.max_children = max_children
+        self.loop_probability = loop_probability
+        self.pool_size = pool_size
+
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        self.task_names = [f"activity_{i}" for i in range(activity_num)]
+        self.model = self.build_block(list(range(activity_num)))
+
+    def build_block(self, activity_list: List[int]) -> Block:
+        """
+        random block over exactly the activities of activity_list
+        """
+        if len(activity_list) == 1:
+            return activity_list[0]
+        operator = self.random.choices(
+            OPERATORS, [self.operator_weights.get(x, 0) for x in OPERATORS]
+        )[0]
+        if operator == "loop":
+            child_num = 2
+        else:
+            child_num = self.random.randint(2, min(self.max_children, len(activity_list)))
+        cut_list = sorted(self.random.sample(range(1, len(activity_list)), child_num - 1))
+        return (
+            operator,
+            [
+                self.build_block(activity_list[start:end])
+                for start, end in zip([0, *cut_list], [*cut_list, len(activity_list)])
+            ],
+        )
+
+    def describe_model(self, block: Block | None = None) -> str:
+        if block is None:
+            block = self.model
+        if isinstance(block, int):
+            return self.task_names[block]
+        operator, child_list = block
+        return f"{operator}({', '.join(self.describe_model(x) for x in child_list)})"
+
+    def simulate_block(self, block: Block, trace: List[int]) -> None:
+        if isinstance(block, int):
+            trace.append(block)
+            return
+        operator, child_list = block
+        if operator == "sequence":
+            for child in child_list:
+                self.simulate_block(child, trace)
+        elif operator == "xor":
+            self.simulate_block(self.random.choice(child_list), trace)
+        elif operator == "loop":
+            self.simulate_block(child_list[0], trace)
+            while self.random.random() < self.loop_probability:
+                self.simulate_block(child_list[1], trace)
+                self.simulate_block(child_list[0], trace)
+        elif operator == "and":
+            # random interleaving that keeps the order inside every branch
+            branch_list: List[List[int]] = []
+            for child in child_list:
+                branch: List[int] = []
+                self.simulate_block(child, branch)
+                branch_list.append(branch)
+            owner_list = [i for i, branch in enumerate(branch_list) for _ in branch]
+            self.random.shuffle(owner_list)
+            position_list = [0] * len(branch_list)
+            for owner in owner_list:
+                trace.append(branch_list[owner][position_list[owner]])
+                position_list[owner] += 1
+        else:
+            raise Exception
+
+    def simulate_trace(self) -> List[int]:
+        trace: List[int] = []
+        self.simulate_block(self.model, trace)
+        return trace
+
+    def add_noise(self, trace: List[int]) -> List[int]:
+        trace = list(trace)
+        match self.random.randrange(3):
+            case 0 if len(trace) > 1:
+                del trace[self.random.randrange(len(trace))]
+            case 1 if len(trace) > 1:
+                i = self.random.randrange(len(trace) - 1)
+                trace[i], trace[i + 1] = trace[i + 1], trace[i]
+            case _:
+                trace.insert(
+                    self.random.randrange(len(trace) + 1),
+                    self.random.randrange(self.activity_num),
+                )
+        return trace
+
+    def generate_log(self, trace_num: int) -> ColumnarLog:
+        # distinct traces: the simulated traces, then the noisy traces
+        variant_index_dict: Dict[Tuple[int, ...], int] = {}
+        variant_list: List[Tuple[int, ...]] = []
+
+        def get_variant(trace: List[int]) -> int:
+            key = tuple(trace)
+            if key not in variant_index_dict.keys():
+                variant_index_dict[key] = len(variant_list)
+                variant_list.append(key)
+            return variant_index_dict[key]
+
+        if self.pool_size is None:
+            trace_variants = np.array(
+                [get_variant(self.simulate_trace()) for _ in range(trace_num)],
+                dtype=np.int64,
+            )
+        else:
+            pool_variants = np.array(
+                [get_variant(self.simulate_trace()) for _ in range(self.pool_size)],
+                dtype=np.int64,
+            )
+            trace_variants = pool_variants[
+                self.rng.integers(0, self.pool_size, trace_num)
+            ]
+        for i in np.flatnonzero(self.rng.random(trace_num) < self.noise_rate):
+            trace_variants[i] = get_variant(
+                self.add_noise(list(variant_list[trace_variants[i]]))
+            )
+
+        # gather the rows of every trace from the flat variant arrays
+        variant_lengths = np.array([len(x) for x in variant_list], dtype=np.int64)
+        variant_offsets = np.zeros(len(variant_list) + 1, dtype=np.int64)
+        np.cumsum(variant_lengths, out=variant_offsets[1:])
+        variant_codes = np.fromiter(
+            (code for variant in variant_list for code in variant),
+            dtype=np.int64,
+            count=int(variant_offsets[-1]),
+        )
+        trace_lengths = variant_lengths[trace_variants]
+        trace_offsets = np.zeros(trace_num + 1, dtype=np.int64)
+        np.cumsum(trace_lengths, out=trace_offsets[1:])
+        event_indexes = np.arange(trace_offsets[-1]) - np.repeat(
+            trace_offsets[:-1], trace_lengths
+        )
+        task_codes = variant_codes[
+            np.repeat(variant_offsets[trace_variants], trace_lengths) + event_indexes
+        ]
+
+        # the activities are numbered in order of first occurrence, like a parsed log
+        used_codes, first_rows = np.unique(task_codes, return_index=True)
+        used_codes = used_codes[np.argsort(first_rows)]
+        code_map = np.full(self.activity_num, -1, dtype=np.int64)
+        code_map[used_codes] = np.arange(len(used_codes))
+        task_codes = code_map[task_codes].astype(np.int32)
+        task_names = [self.task_names[x] for x in used_codes.tolist()]
+
+        # one trace starts every 10 minutes, one event per hour
+        timestamps = np.repeat(np.arange(trace_num) * 600, trace_lengths) + event_indexes * 3600
+
+        # variant indexes in the order of their first trace
+        _, first_traces, variant_inverse = np.unique(
+            trace_variants, return_index=True, return_inverse=True
+        )
+        variant_rank = np.empty(len(first_traces), dtype=np.int64)
+        variant_rank[np.argsort(first_traces)] = np.arange(len(first_traces))
+
+        return ColumnarLog(
+            [f"case_{i}" for i in range(trace_num)],
+            task_names,
+            task_codes,
+            trace_offsets,
+            timestamps,
+            {},
+            trace_variants=variant_rank[variant_inverse],
+        )
+
+
+# python LogGenerator.py --activity 100 --trace 1000000 --noise 0.05 --output big.xes
+# [--max-children 40] [--pool-size 10000]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generate a synthetic log")
+    parser.add_argument("--activity", type=int, default=100)
+    parser.add_argument("--trace", type=int, default=10000)
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--max-children",
+        type=int,
+        default=4,
+        help="most branches of a block (wide xor / and splits)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=None,
+        help="draw the traces from this many simulated traces (default: simulate all)",
+    )
+    parser.add_argument("--output", default="synthetic.xes")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    generator = LogGenerator(
+        args.activity,
+        args.seed,
+        args.noise,
+        max_children=args.max_children,
+        pool_size=args.pool_size,
+    )
+    log = generator.generate_log(args.trace)
+    print(generator.describe_model())
+    print(
+        f"{len(log)} traces, {len(log.task_codes)} events, "
+        f"{len(log.variant_counts)} variants: {time.perf_counter() - start_time:.2f} s"
+    )
+    write_xes(log, args.output)
+    print(f"written to {args.output}: {time.perf_counter() - start_time:.2f} s")
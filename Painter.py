@@ -1,47 +1,260 @@
 from PetriNet import *
+from typing import Dict, Iterable, TextIO
+import io
+import logging
 import os
+import shutil
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# the graphviz shipped with the repo (windows build)
+BUNDLED_DOT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "Graphviz", "bin", "dot.exe"
+)
 
 class Painter:
     def __init__(self) -> None:
         self.dot_code = ""
 
-    def generate_dot_code(self, petriNet: PetriNet) -> None:
+    def generate_dot_code(
+        self,
+        petriNet: PetriNet | FrozenPetriNet,
+        dot_file_path: str | None = "./result.dot",
+    ) -> None:
         """
         generate the dot code
-        save the code into './result.dot'
+        save the code into dot_file_path ('./result.dot', None: not saved)
         """
-        self.dot_code = "digraph SourceGra {\n"
+        buffer = io.StringIO()
+        write_dot(petriNet, buffer)
+        self.dot_code = buffer.getvalue()
+
+        if dot_file_path is not None:
+            with open(dot_file_path, "w") as f:
+                f.write(self.dot_code)
 
-        for id in petriNet.node_dic.keys():
-            node = petriNet.node_dic[id]
-            if isinstance(node, Place):
-                if node.token > 0:
-                    label = "start"
-                else:
-                    label = " "
-                self.dot_code += f'x{id} [shape = circle label="{node.id}"];\n'
-            elif isinstance(node, Transition):
-                self.dot_code += f'x{id} [shape = box label="{node.name}"];\n'
-            else:
-                raise Exception
-
-        for id in petriNet.node_dic.keys():
-            node = petriNet.node_dic[id]
-            for succ_id in node.successor_id_set:
-                self.dot_code += f"x{id} -> x{succ_id};\n"
-
-        self.dot_code += "}"
-
-        dot_file_path = "./result.dot"
-        with open(dot_file_path, "w") as f:
-            f.write(self.dot_code)
-    
     def generate_graph_show(self, show_flag: bool) -> None:
+        """
+        render self.dot_code into './result.png', blocks until dot is done
+        (use RenderWorker to render in the background)
+        """
         DPI = 500
-        command = (
-            f".\\Graphviz\\bin\\dot.exe -Tpng -Gdpi={DPI} .\\result.dot -o result.png"
-        )
-        os.system(command)
+        render_dot_code(self.dot_code, "result.png", DPI)
         if show_flag:
             command = ".\\result.png"
-            os.system(command)
\ No newline at end of file
+            os.system(command)
+
+
+def write_dot(
+    petriNet: PetriNet | FrozenPetriNet,
+    sink: TextIO,
+    graph_name: str = "SourceGra",
+    place_label: str | None = None,
+) -> None:
+    """
+    write the dot code of petriNet to sink line by line,
+    the nodes and the edges are sorted by node id
+    place_label: label of every place (default: the place id)
+    """
+    if isinstance(petriNet, FrozenPetriNet):
+        frozen_net = petriNet
+    else:
+        frozen_net = petriNet.freeze()
+    node_list = frozen_net.get_sorted_nodes()
+
+    sink.write(f"digraph {graph_name} {{\n")
+    for id, is_place, index, _ in node_list:
+        if is_place:
+            label = id if place_label is None else place_label
+            sink.write(f'x{id} [shape = circle label="{label}"];\n')
+        else:
+            sink.write(
+                f'x{id} [shape = box label="{frozen_net.transition_names[index]}"];\n'
+            )
+    for id, is_place, _, successor_list in node_list:
+        if is_place:
+            successor_ids = frozen_net.transition_ids
+        else:
+            successor_ids = frozen_net.place_ids
+        for successor_index in successor_list:
+            sink.write(f"x{id} -> x{successor_ids[successor_index]};\n")
+    sink.write("}")
+
+
+def write_dot_batch(
+    petriNets: Iterable[PetriNet | FrozenPetriNet], sink: TextIO
+) -> int:
+    """
+    write the models of a sequence of windows into one dot file in a single pass,
+    one graph per model named window_0, window_1, ... (dot -O renders them all)
+    return the number of models
+    """
+    model_num = 0
+    for petriNet in petriNets:
+        write_dot(petriNet, sink, f"window_{model_num}")
+        sink.write("\n")
+        model_num += 1
+    return model_num
+
+
+def find_dot_path() -> str:
+    """
+    dot in PATH, otherwise the bundled graphviz on windows
+    """
+    dot_path = shutil.which("dot")
+    if dot_path is not None:
+        return dot_path
+    if os.name == "nt" and os.path.isfile(BUNDLED_DOT_PATH):
+        return BUNDLED_DOT_PATH
+    raise FileNotFoundError(f"graphviz dot not found in PATH or {BUNDLED_DOT_PATH}")
+
+
+def render_dot_code(
+    dot_code: str,
+    output_path: str,
+    dpi: int = 500,
+    dot_path: str | None = None,
+    timeout: float | None = None,
+) -> None:
+    """
+    run the local dot binary (see find_dot_path by default) on dot_code,
+    raise subprocess.TimeoutExpired / subprocess.CalledProcessError if it fails
+    """
+    if dot_path is None:
+        dot_path = find_dot_path()
+    subprocess.run(
+        [dot_path, "-Tpng", f"-Gdpi={dpi}", "-o", output_path],
+        input=dot_code.encode(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        timeout=timeout,
+        check=True,
+    )
+
+
+class RenderWorker:
+    """
+    renders dot code in a background thread
+    only the newest submitted model is kept: a model that is still waiting
+    when a new one is submitted is dropped (counted in dropped_frame_num),
+    so submit() never waits for graphviz
+    the thread is started by the first submit()
+    the first failed render is logged as a warning, the others are only counted
+    """
+
+    def __init__(
+        self,
+        output_path: str = "result.png",
+        dpi: int = 500,
+        dot_path: str | None = None,
+        timeout: float = 30,
+    ) -> None:
+        self.output_path = output_path
+        self.dpi = dpi
+        self.dot_path = dot_path
+        self.timeout = timeout
+
+        # the waiting model: (dot code, submit time)
+        self.pending: Tuple[str, float] | None = None
+        self.closed = False
+        self.busy = False
+        self.condition = threading.Condition()
+
+        self.submitted_num = 0
+        self.rendered_num = 0
+        self.dropped_frame_num = 0
+        self.failed_num = 0
+        # seconds from submit() to the end of the render
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.last_error: Exception | None = None
+
+        self.thread: threading.Thread | None = None
+
+    def submit(self, dot_code: str) -> None:
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("render worker is closed")
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            if self.pending is not None:
+                self.dropped_frame_num += 1
+            self.pending = (dot_code, time.perf_counter())
+            self.submitted_num += 1
+            self.condition.notify_all()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                dot_code, submit_time = self.pending
+                self.pending = None
+                self.busy = True
+
+            error: Exception | None = None
+            try:
+                render_dot_code(
+                    dot_code, self.output_path, self.dpi, self.dot_path, self.timeout
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                error = e
+            latency = time.perf_counter() - submit_time
+
+            with self.condition:
+                self.busy = False
+                if error is None:
+                    self.rendered_num += 1
+                    self.last_latency = latency
+                    self.max_latency = max(self.max_latency, latency)
+                    self.total_latency += latency
+                else:
+                    if self.failed_num == 0:
+                        logger.warning(
+                            "rendering %s failed, later failures are only counted: %s",
+                            self.output_path,
+                            error,
+                        )
+                    self.failed_num += 1
+                    self.last_error = error
+                self.condition.notify_all()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        wait until the newest model is rendered, return False on timeout
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.pending is None and not self.busy, timeout
+            )
+
+    def close(self, timeout: float | None = None) -> None:
+        """
+        render the waiting model and stop the thread
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, int | float]:
+        with self.condition:
+            return {
+                "submitted": self.submitted_num,
+                "rendered": self.rendered_num,
+                "dropped_frames": self.dropped_frame_num,
+                "failed": self.failed_num,
+                "last_latency": self.last_latency,
+                "max_latency": self.max_latency,
+                "mean_latency": self.total_latency / self.rendered_num
+                if self.rendered_num > 0
+                else 0.0,
+            }
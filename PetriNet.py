@@ -1,12 +1,25 @@
 from __future__ import annotations
-from typing import List, Set, Dict, Union, Tuple
-from datetime import datetime
+from typing import List, Set, Dict, Union, Tuple, Iterable, Iterator, Mapping, BinaryIO, TextIO
+from datetime import datetime, timedelta
 import xml.etree.ElementTree as ET
 from copy import copy, deepcopy
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import io
+import mmap
+import sys
+import os
 import json
+import hashlib
+import html
+import shutil
+import tempfile
+import numpy as np
 
 
 class Place:
+    __slots__ = ("id", "predecessor_id_set", "successor_id_set", "token")
+
     def __init__(self, id: int) -> None:
         self.id = id
         self.predecessor_id_set: Set[int] = set()
@@ -15,6 +28,8 @@ class Place:
 
 
 class Transition:
+    __slots__ = ("name", "id", "predecessor_id_set", "successor_id_set")
+
     def __init__(self, name: str, id: int) -> None:
         self.name = name
         self.id = id
@@ -80,83 +95,903 @@ class PetriNet:
 
         return new_m, new_c, new_p
 
+    def freeze(self) -> FrozenPetriNet:
+        return FrozenPetriNet(self)
+
     def generate_json(self) -> str:
-        info_dict: List[Dict[str, List[str | List[str]]]] = []
+        """
+        the nodes and their successors are sorted by id
+        """
+        return self.freeze().generate_json()
 
-        for node in self.node_dic.values():
-            node_dict = {}
-            if isinstance(node, Place):
-                node_dict["type"] = "place"
-                node_dict["name"] = str(node.id)
-                node_dict["successor"] = [
-                    self.node_dic[i].name for i in node.successor_id_set
-                ]
 
+def to_csr(index_lists: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    return (offsets, indexes), the i-th list is indexes[offsets[i]:offsets[i + 1]]
+    """
+    offsets = np.zeros(len(index_lists) + 1, dtype=np.int64)
+    np.cumsum([len(index_list) for index_list in index_lists], out=offsets[1:])
+    indexes = np.array(
+        [index for index_list in index_lists for index in sorted(index_list)],
+        dtype=np.int64,
+    )
+    offsets.setflags(write=False)
+    indexes.setflags(write=False)
+    return offsets, indexes
+
+
+class FrozenPetriNet:
+    """
+    immutable, integer-indexed view of a PetriNet
+    places and transitions are numbered 0..n-1 in node_dic order,
+    the arcs are kept in CSR arrays:
+    the input places of transition t are
+    transition_input_places[transition_input_offsets[t]:transition_input_offsets[t + 1]]
+    (same for transition_output_*, place_input_* and place_output_*)
+    """
+
+    def __init__(self, petriNet: PetriNet) -> None:
+        place_list: List[Place] = []
+        transition_list: List[Transition] = []
+        for node in petriNet.node_dic.values():
+            if isinstance(node, Place):
+                place_list.append(node)
             elif isinstance(node, Transition):
-                node_dict["type"] = "transition"
-                node_dict["name"] = node.name
-                node_dict["successor"] = [
-                    str(self.node_dic[i].id) for i in node.successor_id_set
-                ]
+                transition_list.append(node)
             else:
                 raise Exception
-            info_dict.append(node_dict)
-        return json.dumps(info_dict)
+
+        self.place_ids: Tuple[int, ...] = tuple(place.id for place in place_list)
+        self.transition_ids: Tuple[int, ...] = tuple(
+            transition.id for transition in transition_list
+        )
+        self.transition_names: Tuple[str, ...] = tuple(
+            transition.name for transition in transition_list
+        )
+        self.place_index_dict: Dict[int, int] = {
+            place_id: i for i, place_id in enumerate(self.place_ids)
+        }
+        self.transition_index_dict: Dict[str, int] = {
+            name: i for i, name in enumerate(self.transition_names)
+        }
+        transition_id_index_dict = {
+            transition_id: i for i, transition_id in enumerate(self.transition_ids)
+        }
+
+        self.transition_input_offsets, self.transition_input_places = to_csr(
+            [
+                [self.place_index_dict[i] for i in transition.predecessor_id_set]
+                for transition in transition_list
+            ]
+        )
+        self.transition_output_offsets, self.transition_output_places = to_csr(
+            [
+                [self.place_index_dict[i] for i in transition.successor_id_set]
+                for transition in transition_list
+            ]
+        )
+        self.place_input_offsets, self.place_input_transitions = to_csr(
+            [
+                [transition_id_index_dict[i] for i in place.predecessor_id_set]
+                for place in place_list
+            ]
+        )
+        self.place_output_offsets, self.place_output_transitions = to_csr(
+            [
+                [transition_id_index_dict[i] for i in place.successor_id_set]
+                for place in place_list
+            ]
+        )
+
+        self.initial_marking = np.array(
+            [place.token for place in place_list], dtype=np.int64
+        )
+        self.initial_marking.setflags(write=False)
+        self.initial_token_num = int(self.initial_marking[self.initial_marking > 0].sum())
+        self.sink_place_list: Tuple[int, ...] = tuple(
+            np.flatnonzero(np.diff(self.place_output_offsets) == 0).tolist()
+        )
+        self.source_place_list: Tuple[int, ...] = tuple(
+            np.flatnonzero(np.diff(self.place_input_offsets) == 0).tolist()
+        )
+
+        # plain tuples/arrays for the replay loop, faster than indexing numpy
+        self.input_place_lists: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(self.get_input_places(t).tolist()) for t in range(len(transition_list))
+        )
+        self.output_place_lists: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(self.get_output_places(t).tolist())
+            for t in range(len(transition_list))
+        )
+        self.initial_marking_array = array("q", self.initial_marking.tolist())
+
+    def get_input_places(self, transition_index: int) -> np.ndarray:
+        return self.transition_input_places[
+            self.transition_input_offsets[transition_index] : self.transition_input_offsets[
+                transition_index + 1
+            ]
+        ]
+
+    def get_output_places(self, transition_index: int) -> np.ndarray:
+        return self.transition_output_places[
+            self.transition_output_offsets[transition_index] : self.transition_output_offsets[
+                transition_index + 1
+            ]
+        ]
+
+    def get_place_successors(self, place_index: int) -> np.ndarray:
+        return self.place_output_transitions[
+            self.place_output_offsets[place_index] : self.place_output_offsets[
+                place_index + 1
+            ]
+        ]
+
+    def get_place_predecessors(self, place_index: int) -> np.ndarray:
+        return self.place_input_transitions[
+            self.place_input_offsets[place_index] : self.place_input_offsets[
+                place_index + 1
+            ]
+        ]
+
+    def fingerprint(self) -> str:
+        """
+        hash of the structure, independent of the node ids and the node order:
+        the transition names and every place as
+        (sorted input transition names, sorted output transition names, tokens)
+        """
+        place_keys = sorted(
+            (
+                sorted(self.transition_names[t] for t in self.get_place_predecessors(i)),
+                sorted(self.transition_names[t] for t in self.get_place_successors(i)),
+                int(self.initial_marking[i]),
+            )
+            for i in range(len(self.place_ids))
+        )
+        structure = json.dumps([sorted(self.transition_names), place_keys])
+        return hashlib.sha1(structure.encode()).hexdigest()
+
+    def new_marking(self) -> array:
+        return array("q", self.initial_marking_array)
+
+    def replay(
+        self, transition_index_list: Iterable[int], marking: array
+    ) -> Tuple[int, int, int, int]:
+        """
+        replay one trace from the initial marking,
+        marking is a scratch vector (see new_marking) that is reset first
+        return (m, c, p, r)
+        """
+        marking[:] = self.initial_marking_array
+        input_place_lists = self.input_place_lists
+        output_place_lists = self.output_place_lists
+        m = 0
+        c = 0
+        p = self.initial_token_num
+
+        for transition_index in transition_index_list:
+            input_place_list = input_place_lists[transition_index]
+            for place_index in input_place_list:
+                if marking[place_index] <= 0:
+                    m += 1
+                else:
+                    marking[place_index] -= 1
+            c += len(input_place_list)
+            output_place_list = output_place_lists[transition_index]
+            for place_index in output_place_list:
+                marking[place_index] += 1
+            p += len(output_place_list)
+
+        for place_index in self.sink_place_list:
+            if marking[place_index] <= 0:
+                m += 1
+            else:
+                marking[place_index] -= 1
+        c += len(self.sink_place_list)
+
+        r = sum(token for token in marking if token > 0)
+        return m, c, p, r
+
+    def get_sorted_nodes(self) -> List[Tuple[int, bool, int, List[int]]]:
+        """
+        return [(node id, is place, index, successor indexes)] sorted by node id,
+        the successors are sorted by node id too
+        """
+        node_list: List[Tuple[int, bool, int, List[int]]] = []
+        for t, transition_id in enumerate(self.transition_ids):
+            successor_list = sorted(
+                self.get_output_places(t).tolist(), key=lambda i: self.place_ids[i]
+            )
+            node_list.append((transition_id, False, t, successor_list))
+        for i, place_id in enumerate(self.place_ids):
+            successor_list = sorted(
+                self.get_place_successors(i).tolist(),
+                key=lambda t: self.transition_ids[t],
+            )
+            node_list.append((place_id, True, i, successor_list))
+        node_list.sort()
+        return node_list
+
+    def write_json(self, sink: TextIO) -> None:
+        """
+        write the json of generate_json to sink node by node
+        """
+        sink.write("[")
+        for k, (node_id, is_place, index, successor_list) in enumerate(
+            self.get_sorted_nodes()
+        ):
+            if k > 0:
+                sink.write(", ")
+            if is_place:
+                node_dict = {
+                    "type": "place",
+                    "name": str(node_id),
+                    "successor": [self.transition_names[t] for t in successor_list],
+                }
+            else:
+                node_dict = {
+                    "type": "transition",
+                    "name": self.transition_names[index],
+                    "successor": [str(self.place_ids[i]) for i in successor_list],
+                }
+            json.dump(node_dict, sink)
+        sink.write("]")
+
+    def generate_json(self) -> str:
+        buffer = io.StringIO()
+        self.write_json(buffer)
+        return buffer.getvalue()
+
+
+def write_json_batch(petriNets: Iterable[PetriNet | FrozenPetriNet], sink: TextIO) -> int:
+    """
+    write one json line per model (e.g. one per window) in a single pass,
+    return the number of models
+    """
+    model_num = 0
+    for petriNet in petriNets:
+        if isinstance(petriNet, PetriNet):
+            petriNet = petriNet.freeze()
+        petriNet.write_json(sink)
+        sink.write("\n")
+        model_num += 1
+    return model_num
+
+
+Event = Dict[str, Union[int, str, datetime]]
+Log = Dict[str, List[Event]]
+TraceStream = Iterable[Tuple[str, List[Event]]]
+
+
+def parse_event_attribute(
+    attribute_node: ET.Element,
+) -> Tuple[str, Union[str, int, datetime]]:
+    key = attribute_node.attrib["key"]
+    value_str = attribute_node.attrib["value"]
+    match attribute_node.tag:
+        case "{http://www.xes-standard.org/}string":
+            value = value_str
+        case "{http://www.xes-standard.org/}int":
+            value = int(value_str)
+        case "{http://www.xes-standard.org/}date":
+            year_mon_day_str, hour_min_sec_str = value_str.split("T")
+            time_strs = year_mon_day_str.split("-")
+            year = int(time_strs[0])
+            month = int(time_strs[1])
+            day = int(time_strs[2])
+            time_strs = hour_min_sec_str.split(":")
+            hour = int(time_strs[0])
+            minute = int(time_strs[1])
+            value = datetime(year, month, day, hour, minute)
+    return key, value
+
+
+def parse_trace(trace_node: ET.Element) -> Tuple[str, List[Event]]:
+    for node in trace_node:
+        if node.tag == "{http://www.xes-standard.org/}string":
+            case_id = node.attrib["value"]
+    trace: List[Event] = []
+    for event_node in trace_node:
+        if event_node.tag == "{http://www.xes-standard.org/}event":
+            event: Event = {}
+            for attribute_node in event_node:
+                key, value = parse_event_attribute(attribute_node)
+                event[key] = value
+            trace.append(event)
+    return case_id, trace
+
+
+def iter_from_file(filename: str | BinaryIO) -> Iterator[Tuple[str, List[Event]]]:
+    """
+    yield (case id, events) one trace at a time
+    every parsed trace is cleared, so the memory only depends on the largest trace
+    """
+    root = None
+    for xml_event, node in ET.iterparse(filename, events=("start", "end")):
+        if root is None:
+            root = node
+        if xml_event == "end" and node.tag == "{http://www.xes-standard.org/}trace":
+            yield parse_trace(node)
+            root.clear()
+
+
+def encode_attribute_value(value: object) -> Dict[str, str]:
+    # json.dump default: the only non-json attribute values are dates
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    raise TypeError(f"cannot cache attribute value {value!r}")
+
+
+def decode_attribute_value(value: Dict[str, object]) -> object:
+    if len(value) == 1 and "datetime" in value.keys():
+        return datetime.fromisoformat(value["datetime"])
+    return value
+
+
+class ColumnarLog(Mapping[str, List[Event]]):
+    """
+    compact log, every event is one row of flat arrays
+    task_codes[row] is the index of the activity name in task_names (-1 if missing)
+    the rows of the i-th trace are trace_offsets[i]:trace_offsets[i + 1]
+    timestamps[row] is in seconds since 1970-01-01 (NO_TIMESTAMP if missing)
+    the other attributes are kept as one column per key (None if missing)
+    traces with the same activity sequence share a variant:
+    trace_variants[i] is the variant of the i-th trace, variant_traces[v] is
+    the first trace of variant v and variant_counts[v] its number of traces
+    it can still be used as the old Dict[case id, List[event dict]]
+    """
+
+    EPOCH = datetime(1970, 1, 1)
+    NO_TIMESTAMP = np.iinfo(np.int64).min
+
+    def __init__(
+        self,
+        case_ids: List[str],
+        task_names: List[str],
+        task_codes: np.ndarray,
+        trace_offsets: np.ndarray,
+        timestamps: np.ndarray,
+        attribute_dict: Dict[str, List[Union[int, str, None]]] | None,
+        attribute_file: str | None = None,
+        trace_variants: np.ndarray | None = None,
+    ) -> None:
+        """
+        if attribute_dict is None, it is loaded from attribute_file when first used
+        if trace_variants is None, the variants are built from task_codes
+        """
+        self.case_ids = case_ids
+        self.task_names = task_names
+        self.task_codes = task_codes
+        self.trace_offsets = trace_offsets
+        self.timestamps = timestamps
+        self.attribute_file = attribute_file
+        self.loaded_attribute_dict = attribute_dict
+        self.case_index_dict = {case_id: i for i, case_id in enumerate(case_ids)}
+
+        if trace_variants is None:
+            trace_variants = self.build_trace_variants()
+        self.trace_variants = trace_variants
+        # variant indexes are given in the order of their first trace
+        self.variant_traces = np.unique(trace_variants, return_index=True)[1]
+        self.variant_counts = np.bincount(
+            trace_variants, minlength=len(self.variant_traces)
+        )
+
+    def build_trace_variants(self) -> np.ndarray:
+        variant_index_dict: Dict[bytes, int] = {}
+        trace_variants = np.empty(len(self.case_ids), dtype=np.int64)
+        for i in range(len(self.case_ids)):
+            variant_key = self.get_trace_codes(i).tobytes()
+            if variant_key not in variant_index_dict.keys():
+                variant_index_dict[variant_key] = len(variant_index_dict)
+            trace_variants[i] = variant_index_dict[variant_key]
+        return trace_variants
+
+    @property
+    def attribute_dict(self) -> Dict[str, List[Union[int, str, None]]]:
+        if self.loaded_attribute_dict is None:
+            with open(self.attribute_file) as f:
+                self.loaded_attribute_dict = json.load(
+                    f, object_hook=decode_attribute_value
+                )
+        return self.loaded_attribute_dict
+
+    def save(self, cache_dir: str, cache_key: Dict[str, Union[int, str]]) -> None:
+        """
+        save the log as .npy files that can be memory-mapped by load()
+        the files are written into a new directory that then replaces cache_dir,
+        so the files of an older cache that another process has memory-mapped
+        are never rewritten in place
+        """
+        parent_dir = os.path.dirname(os.path.abspath(cache_dir))
+        temp_dir = tempfile.mkdtemp(
+            prefix=os.path.basename(cache_dir) + ".", dir=parent_dir
+        )
+        try:
+            np.save(os.path.join(temp_dir, "task_codes.npy"), self.task_codes)
+            np.save(os.path.join(temp_dir, "trace_offsets.npy"), self.trace_offsets)
+            np.save(os.path.join(temp_dir, "timestamps.npy"), self.timestamps)
+            np.save(os.path.join(temp_dir, "trace_variants.npy"), self.trace_variants)
+            with open(os.path.join(temp_dir, "attributes.json"), "w") as f:
+                json.dump(self.attribute_dict, f, default=encode_attribute_value)
+            with open(os.path.join(temp_dir, "meta.json"), "w") as f:
+                json.dump(
+                    {
+                        "key": cache_key,
+                        "case_ids": self.case_ids,
+                        "task_names": self.task_names,
+                    },
+                    f,
+                )
+
+            # os.replace cannot replace a non-empty directory:
+            # move the old cache away first, its mapped files stay readable
+            old_dir = None
+            if os.path.exists(cache_dir):
+                old_dir = tempfile.mkdtemp(
+                    prefix=os.path.basename(cache_dir) + ".old.", dir=parent_dir
+                )
+                os.replace(cache_dir, os.path.join(old_dir, "cache"))
+            os.replace(temp_dir, cache_dir)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        if old_dir is not None:
+            # fails on windows while the old files are mapped, they are left behind
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    @staticmethod
+    def load(
+        cache_dir: str, cache_key: Dict[str, Union[int, str]]
+    ) -> ColumnarLog | None:
+        """
+        return None if there is no cache, or it was made for another file version
+        """
+        meta_path = os.path.join(cache_dir, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta["key"] != cache_key:
+            return None
+
+        return ColumnarLog(
+            meta["case_ids"],
+            meta["task_names"],
+            np.load(os.path.join(cache_dir, "task_codes.npy"), mmap_mode="r"),
+            np.load(os.path.join(cache_dir, "trace_offsets.npy"), mmap_mode="r"),
+            np.load(os.path.join(cache_dir, "timestamps.npy"), mmap_mode="r"),
+            None,
+            os.path.join(cache_dir, "attributes.json"),
+            np.load(os.path.join(cache_dir, "trace_variants.npy"), mmap_mode="r"),
+        )
+
+    @staticmethod
+    def from_traces(log: Log | TraceStream) -> ColumnarLog:
+        """
+        the events of the same case id are merged, in the order they appear
+        """
+        case_index_dict: Dict[str, int] = {}
+        task_code_dict: Dict[str, int] = {}
+        case_indexes = array("q")
+        task_codes = array("q")
+        timestamps = array("q")
+        attribute_dict: Dict[str, List[Union[int, str, None]]] = {}
+        event_num = 0
+
+        for case_id, trace in iter_traces(log):
+            if case_id not in case_index_dict.keys():
+                case_index_dict[case_id] = len(case_index_dict)
+            case_index = case_index_dict[case_id]
+            for event in trace:
+                case_indexes.append(case_index)
+                task_codes.append(-1)
+                timestamps.append(ColumnarLog.NO_TIMESTAMP)
+                for key, value in event.items():
+                    if key == "concept:name":
+                        if value not in task_code_dict.keys():
+                            task_code_dict[value] = len(task_code_dict)
+                        task_codes[event_num] = task_code_dict[value]
+                    elif key == "time:timestamp":
+                        timestamps[event_num] = (value - ColumnarLog.EPOCH) // timedelta(
+                            seconds=1
+                        )
+                    else:
+                        if key not in attribute_dict.keys():
+                            attribute_dict[key] = [None] * event_num
+                        if isinstance(value, str):
+                            value = sys.intern(value)
+                        attribute_dict[key].append(value)
+                event_num += 1
+                for column in attribute_dict.values():
+                    if len(column) < event_num:
+                        column.append(None)
+
+        return ColumnarLog.from_rows(
+            list(case_index_dict.keys()),
+            list(task_code_dict.keys()),
+            np.frombuffer(case_indexes, dtype=np.int64),
+            np.frombuffer(task_codes, dtype=np.int64).astype(np.int32),
+            np.frombuffer(timestamps, dtype=np.int64).copy(),
+            attribute_dict,
+        )
+
+    @staticmethod
+    def from_rows(
+        case_ids: List[str],
+        task_names: List[str],
+        case_index_array: np.ndarray,
+        task_code_array: np.ndarray,
+        timestamp_array: np.ndarray,
+        attribute_dict: Dict[str, List[Union[int, str, None]]],
+    ) -> ColumnarLog:
+        """
+        group the rows by case_index_array (keeping their order inside a case)
+        """
+        if np.any(np.diff(case_index_array) < 0):
+            # a case id appears in more than one trace, group its rows together
+            order = np.argsort(case_index_array, kind="stable")
+            case_index_array = case_index_array[order]
+            task_code_array = task_code_array[order]
+            timestamp_array = timestamp_array[order]
+            for key in attribute_dict.keys():
+                column = attribute_dict[key]
+                attribute_dict[key] = [column[row] for row in order]
+        trace_offsets = np.zeros(len(case_ids) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(case_index_array, minlength=len(case_ids)),
+            out=trace_offsets[1:],
+        )
+
+        return ColumnarLog(
+            case_ids,
+            task_names,
+            task_code_array,
+            trace_offsets,
+            timestamp_array,
+            attribute_dict,
+        )
+
+    @staticmethod
+    def concat(log_list: List[ColumnarLog]) -> ColumnarLog:
+        """
+        same result as from_traces over the traces of all logs, in order
+        """
+        case_index_dict: Dict[str, int] = {}
+        task_code_dict: Dict[str, int] = {}
+        case_index_arrays: List[np.ndarray] = []
+        task_code_arrays: List[np.ndarray] = []
+        attribute_keys: Dict[str, None] = {}
+        for log in log_list:
+            for key in log.attribute_dict.keys():
+                attribute_keys[key] = None
+
+        attribute_dict: Dict[str, List[Union[int, str, None]]] = {
+            key: [] for key in attribute_keys
+        }
+        for log in log_list:
+            for case_id in log.case_ids:
+                if case_id not in case_index_dict.keys():
+                    case_index_dict[case_id] = len(case_index_dict)
+            for task_name in log.task_names:
+                if task_name not in task_code_dict.keys():
+                    task_code_dict[task_name] = len(task_code_dict)
+            case_index_map = np.array(
+                [case_index_dict[case_id] for case_id in log.case_ids], dtype=np.int64
+            )
+            # the last item maps the missing code -1 to -1
+            task_code_map = np.array(
+                [task_code_dict[task_name] for task_name in log.task_names] + [-1],
+                dtype=np.int32,
+            )
+            case_index_arrays.append(
+                np.repeat(case_index_map, np.diff(log.trace_offsets))
+            )
+            task_code_arrays.append(task_code_map[log.task_codes])
+            row_num = len(log.task_codes)
+            for key, column in attribute_dict.items():
+                column.extend(log.attribute_dict.get(key, [None] * row_num))
+
+        return ColumnarLog.from_rows(
+            list(case_index_dict.keys()),
+            list(task_code_dict.keys()),
+            np.concatenate(case_index_arrays + [np.zeros(0, dtype=np.int64)]),
+            np.concatenate(task_code_arrays + [np.zeros(0, dtype=np.int32)]),
+            np.concatenate(
+                [log.timestamps for log in log_list] + [np.zeros(0, dtype=np.int64)]
+            ),
+            attribute_dict,
+        )
+
+    def __len__(self) -> int:
+        return len(self.case_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.case_ids)
+
+    def __contains__(self, case_id: object) -> bool:
+        return case_id in self.case_index_dict
+
+    def __getitem__(self, case_id: str) -> List[Event]:
+        case_index = self.case_index_dict[case_id]
+        trace: List[Event] = []
+        for row in range(
+            self.trace_offsets[case_index], self.trace_offsets[case_index + 1]
+        ):
+            event: Event = {}
+            if self.task_codes[row] >= 0:
+                event["concept:name"] = self.task_names[self.task_codes[row]]
+            if self.timestamps[row] != ColumnarLog.NO_TIMESTAMP:
+                event["time:timestamp"] = ColumnarLog.EPOCH + timedelta(
+                    seconds=int(self.timestamps[row])
+                )
+            for key, column in self.attribute_dict.items():
+                if column[row] is not None:
+                    event[key] = column[row]
+            trace.append(event)
+        return trace
+
+    def get_trace_codes(self, case_index: int) -> np.ndarray:
+        return self.task_codes[
+            self.trace_offsets[case_index] : self.trace_offsets[case_index + 1]
+        ]
+
+    def get_variant_rows(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        return (rows of the first trace of every variant, their trace offsets)
+        """
+        trace_starts = self.trace_offsets[self.variant_traces]
+        trace_lengths = self.trace_offsets[self.variant_traces + 1] - trace_starts
+        variant_offsets = np.zeros(len(self.variant_traces) + 1, dtype=np.int64)
+        np.cumsum(trace_lengths, out=variant_offsets[1:])
+        rows = np.arange(variant_offsets[-1], dtype=np.int64) + np.repeat(
+            trace_starts - variant_offsets[:-1], trace_lengths
+        )
+        return rows, variant_offsets
+
+    def dependency_graph(self) -> Dict[str, Dict[str, int]]:
+        """
+        same result (and same key order) as looping over the traces
+        every variant is counted once and weighted by its number of traces
+        """
+        rows, variant_offsets = self.get_variant_rows()
+        task_codes = self.task_codes[rows].astype(np.int64)
+        row_weights = np.repeat(self.variant_counts, np.diff(variant_offsets))
+
+        task_num = len(self.task_names)
+        is_pair = np.ones(max(len(task_codes) - 1, 0), dtype=bool)
+        trace_starts = variant_offsets[1:-1]
+        trace_starts = trace_starts[(trace_starts > 0) & (trace_starts < len(task_codes))]
+        is_pair[trace_starts - 1] = False
+        pred_codes = task_codes[:-1]
+        succ_codes = task_codes[1:]
+        is_pair &= (pred_codes >= 0) & (succ_codes >= 0)
+
+        pair_codes = pred_codes[is_pair] * task_num + succ_codes[is_pair]
+        pair_codes, first_rows, pair_inverse = np.unique(
+            pair_codes, return_index=True, return_inverse=True
+        )
+        frequencies = np.zeros(len(pair_codes), dtype=np.int64)
+        np.add.at(frequencies, pair_inverse, row_weights[:-1][is_pair])
+        result: Dict[str, Dict[str, int]] = {}
+        for i in np.argsort(first_rows, kind="stable"):
+            pred_task = self.task_names[pair_codes[i] // task_num]
+            succ_task = self.task_names[pair_codes[i] % task_num]
+            if pred_task not in result.keys():
+                result[pred_task] = {}
+            result[pred_task][succ_task] = int(frequencies[i])
+        return result
+
+
+def find_chunk_offsets(filename: str, chunk_num: int) -> List[int]:
+    """
+    split the traces of the file into about chunk_num byte ranges
+    return [first trace start, chunk starts..., end of the last trace]
+    every chunk starts at a '<trace' tag
+    """
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [0, 0]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+
+            def find_trace(start: int) -> int:
+                while True:
+                    start = file_map.find(b"<trace", start)
+                    if start < 0 or file_map[start + 6 : start + 7] in (
+                        b">",
+                        b" ",
+                        b"\t",
+                        b"\r",
+                        b"\n",
+                    ):
+                        return start
+                    start += 6
+
+            end = file_map.rfind(b"</log>")
+            first = find_trace(0)
+            if first < 0 or end < 0:
+                return [0, 0]
+
+            offset_list = [first]
+            for i in range(1, chunk_num):
+                offset = find_trace(first + (end - first) * i // chunk_num)
+                if offset < 0 or offset >= end:
+                    break
+                if offset > offset_list[-1]:
+                    offset_list.append(offset)
+            offset_list.append(end)
+            return offset_list
+
+
+def parse_chunk(filename: str, header_end: int, start: int, end: int) -> ColumnarLog:
+    """
+    parse the traces in [start, end) of the file,
+    with the original header so the namespaces stay the same
+    """
+    with open(filename, "rb") as f:
+        header = f.read(header_end)
+        f.seek(start)
+        chunk = f.read(end - start)
+    return ColumnarLog.from_traces(
+        iter_from_file(io.BytesIO(header + chunk + b"</log>"))
+    )
+
+
+def parse_file(filename: str, process_num: int = 1) -> ColumnarLog:
+    """
+    process_num > 1: parse the file on several processes,
+    the chunks are split on trace boundaries and merged in the original order
+    """
+    if process_num <= 1:
+        return ColumnarLog.from_traces(iter_from_file(filename))
+
+    offset_list = find_chunk_offsets(filename, process_num * 4)
+    if len(offset_list) <= 2:
+        return ColumnarLog.from_traces(iter_from_file(filename))
+    with ProcessPoolExecutor(process_num) as executor:
+        log_list = list(
+            executor.map(
+                parse_chunk,
+                [filename] * (len(offset_list) - 1),
+                [offset_list[0]] * (len(offset_list) - 1),
+                offset_list[:-1],
+                offset_list[1:],
+            )
+        )
+    return ColumnarLog.concat(log_list)
+
+
+CACHE_VERSION = 3
+
+
+def get_cache_key(filename: str) -> Dict[str, Union[int, str]]:
+    file_stat = os.stat(filename)
+    return {
+        "version": CACHE_VERSION,
+        "path": os.path.abspath(filename),
+        "size": file_stat.st_size,
+        "mtime": file_stat.st_mtime_ns,
+    }
 
 
 def read_from_file(
-    filename: str,
-) -> Dict[str, List[Dict[str, Union[int, str, datetime]]]]:
-    tree = ET.parse(filename)
-    root = tree.getroot()
-    result: Dict[str, List[Dict[str, Union[int, str, datetime]]]] = {}
-
-    def parse_event_attribute(
-        attribute_node: ET.Element,
-    ) -> Tuple[str, Union[str, int, datetime]]:
-        key = attribute_node.attrib["key"]
-        value_str = attribute_node.attrib["value"]
-        match attribute_node.tag:
-            case "{http://www.xes-standard.org/}string":
-                value = value_str
-            case "{http://www.xes-standard.org/}int":
-                value = int(value_str)
-            case "{http://www.xes-standard.org/}date":
-                year_mon_day_str, hour_min_sec_str = value_str.split("T")
-                time_strs = year_mon_day_str.split("-")
-                year = int(time_strs[0])
-                month = int(time_strs[1])
-                day = int(time_strs[2])
-                time_strs = hour_min_sec_str.split(":")
-                hour = int(time_strs[0])
-                minute = int(time_strs[1])
-                value = datetime(year, month, day, hour, minute)
-        return key, value
-
-    for child in root:
-        if child.tag == "{http://www.xes-standard.org/}trace":
-            for node in child:
-                if node.tag == "{http://www.xes-standard.org/}string":
-                    case_id = node.attrib["value"]
-            if case_id not in result.keys():
-                result[case_id] = []
-            for event_node in child:
-                if event_node.tag == "{http://www.xes-standard.org/}event":
-                    event: Dict[str, Union[str, int, datetime]] = {}
-                    for attribute_node in event_node:
-                        key, value = parse_event_attribute(attribute_node)
-                        event[key] = value
-                    result[case_id].append(event)
+    filename: str, use_cache: bool = True, process_num: int = 1
+) -> ColumnarLog:
+    """
+    the parsed log is cached in '<filename>.cache/'
+    and reloaded with memory-mapping while the file is unchanged
+    process_num > 1 parses the file on several processes
+    """
+    if not use_cache:
+        return parse_file(filename, process_num)
+
+    cache_dir = filename + ".cache"
+    cache_key = get_cache_key(filename)
+    log = ColumnarLog.load(cache_dir, cache_key)
+    if log is None:
+        log = parse_file(filename, process_num)
+        try:
+            log.save(cache_dir, cache_key)
+        except OSError:
+            # e.g. read-only directory, just run without cache
+            pass
+    return log
+
+
+XES_HEADER = """<?xml version="1.0" encoding="UTF-8" ?>
+<log xes.version="1.0" xes.features="nested-attributes" xmlns="http://www.xes-standard.org/">
+\t<extension name="Time" prefix="time" uri="http://www.xes-standard.org/time.xesext"/>
+\t<extension name="Concept" prefix="concept" uri="http://www.xes-standard.org/concept.xesext"/>
+"""
+
+
+def write_xes(log: ColumnarLog, filename: str, chunk_trace_num: int = 10000) -> None:
+    """
+    write log as a XES file that read_from_file can parse
+    the events are formatted chunk_trace_num traces at a time
+    """
+    # every event is "<event>" + name + attributes + timestamp + "</event>"
+    task_name_strs = [
+        f'\t\t<event>\n\t\t\t<string key="concept:name" value="{html.escape(task_name)}"/>\n'
+        for task_name in log.task_names
+    ] + ["\t\t<event>\n"]
+
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(XES_HEADER)
+        for first_trace in range(0, len(log.case_ids), chunk_trace_num):
+            last_trace = min(first_trace + chunk_trace_num, len(log.case_ids))
+            first_row = int(log.trace_offsets[first_trace])
+            last_row = int(log.trace_offsets[last_trace])
+
+            # the same timestamps come back often, each one is formatted once
+            unique_timestamps, timestamp_inverse = np.unique(
+                log.timestamps[first_row:last_row], return_inverse=True
+            )
+            has_timestamp = unique_timestamps != ColumnarLog.NO_TIMESTAMP
+            unique_time_strs = [
+                f'\t\t\t<date key="time:timestamp" value="{x}+00:00"/>\n\t\t</event>\n'
+                if valid
+                else "\t\t</event>\n"
+                for x, valid in zip(
+                    np.datetime_as_string(
+                        np.where(has_timestamp, unique_timestamps, 0).astype(
+                            "datetime64[s]"
+                        )
+                    ),
+                    has_timestamp.tolist(),
+                )
+            ]
+            column_strs_list = [
+                [
+                    ""
+                    if value is None
+                    else f'\t\t\t<{"int" if isinstance(value, int) else "string"} '
+                    f'key="{html.escape(key)}" value="{html.escape(str(value))}"/>\n'
+                    for value in column[first_row:last_row]
+                ]
+                for key, column in log.attribute_dict.items()
+            ]
+            if len(column_strs_list) > 0:
+                middle_strs = ["".join(x) for x in zip(*column_strs_list)]
+            else:
+                middle_strs = [""] * (last_row - first_row)
+            event_strs = [
+                task_name_strs[task_code] + middle_str + unique_time_strs[time_index]
+                for task_code, middle_str, time_index in zip(
+                    log.task_codes[first_row:last_row].tolist(),
+                    middle_strs,
+                    timestamp_inverse.tolist(),
+                )
+            ]
+
+            row_offsets = (log.trace_offsets[first_trace : last_trace + 1] - first_row).tolist()
+            f.write(
+                "".join(
+                    f'\t<trace>\n\t\t<string key="concept:name" '
+                    f'value="{html.escape(log.case_ids[first_trace + k])}"/>\n'
+                    + "".join(event_strs[row_offsets[k] : row_offsets[k + 1]])
+                    + "\t</trace>\n"
+                    for k in range(last_trace - first_trace)
+                )
+            )
+        f.write("</log>\n")
+
+
+def iter_traces(log: Log | ColumnarLog | TraceStream) -> TraceStream:
+    """
+    accept a log dict, a ColumnarLog and a stream of (case id, events)
+    """
+    if isinstance(log, Mapping):
+        return log.items()
+    return log
 
-    return result
 
+def dependency_graph_file(log: Log | ColumnarLog | TraceStream) -> Dict[str, Dict[str, int]]:
+    if isinstance(log, ColumnarLog):
+        return log.dependency_graph()
 
-def dependency_graph_file(
-    log: Dict[str, List[Dict[str, Union[int, str, datetime]]]]
-) -> Dict[str, Dict[str, int]]:
     result: Dict[str, Dict[str, int]] = {}
-    for case_id in log.keys():
-        trace = log[case_id]
+    for case_id, trace in iter_traces(log):
         for index in range(len(trace) - 1):
             pred_task = trace[index]["concept:name"]
             succ_task = trace[index + 1]["concept:name"]
@@ -3,110 +3,177 @@ from typing import List, Set, Dict, Union, Tuple
 from datetime import datetime
 import xml.etree.ElementTree as ET
 from copy import copy, deepcopy
+import numpy as np
 from PetriNet import *
+import logging
+
+# the dependency graph is logged at DEBUG
+logger = logging.getLogger(__name__)
 
-def alpha(log: Dict[str, List[Dict[str, Union[int, str, datetime]]]]) -> PetriNet:
-    dependency_graph = dependency_graph_file(log)
 
+def format_dependency_graph(dependency_graph: Dict[str, Dict[str, int]]) -> str:
+    line_list: List[str] = []
     for pred in dependency_graph.keys():
-        print(pred)
+        line_list.append(pred)
         for succ in dependency_graph[pred]:
-            print(f" {succ} {dependency_graph[pred][succ]}")
-        print()
-        
+            line_list.append(f" {succ} {dependency_graph[pred][succ]}")
+        line_list.append("")
+    return "\n".join(line_list)
+
+
+def alpha(log: Log | ColumnarLog | TraceStream) -> PetriNet:
+    dependency_graph = dependency_graph_file(log)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("dependency graph:\n%s", format_dependency_graph(dependency_graph))
 
-    task_set: Set[str] = set()
+    task_index_dict: Dict[str, int] = {}
     for pred_task in dependency_graph.keys():
-        if pred_task not in task_set:
-            task_set.add(pred_task)
-        for succ_task in dependency_graph[pred_task].keys():
-            if succ_task not in task_set:
-                task_set.add(succ_task)
-
-    # print(task_set)
-
-    def check_direct_succ(pred_task: str, succ_task: str) -> bool:
-        nonlocal dependency_graph
-        if pred_task not in dependency_graph.keys():
-            return False
-        elif succ_task not in dependency_graph[pred_task].keys():
-            return False
-        else:
-            return True
-
-    def check_causality(pred_task: str, succ_task: str) -> bool:
-        nonlocal check_direct_succ
-        return check_direct_succ(pred_task, succ_task) and not check_direct_succ(
-            succ_task, pred_task
-        )
-
-    first_task_set: Set[str] = copy(task_set)
+        for task in [pred_task, *dependency_graph[pred_task].keys()]:
+            if task not in task_index_dict.keys():
+                task_index_dict[task] = len(task_index_dict)
+    task_list: List[str] = list(task_index_dict.keys())
+
+    # footprint: direct_matrix[a][b] is a > b
+    direct_matrix = np.zeros((len(task_list), len(task_list)), dtype=bool)
     for pred_task in dependency_graph.keys():
         for succ_task in dependency_graph[pred_task].keys():
-            if succ_task in first_task_set:
-                first_task_set.remove(succ_task)
+            direct_matrix[task_index_dict[pred_task], task_index_dict[succ_task]] = True
+    causal_matrix = direct_matrix & ~direct_matrix.T
+    # a self-loop a > a does not make a set invalid
+    unrelated_matrix = ~direct_matrix & ~direct_matrix.T
+    np.fill_diagonal(unrelated_matrix, True)
+
+    def to_bitset(row: np.ndarray) -> int:
+        bitset = 0
+        for index in np.flatnonzero(row):
+            bitset |= 1 << int(index)
+        return bitset
+
+    def to_index_list(bitset: int) -> List[int]:
+        index_list = []
+        while bitset:
+            lowest_bit = bitset & -bitset
+            index_list.append(lowest_bit.bit_length() - 1)
+            bitset ^= lowest_bit
+        return index_list
+
+    succ_bitset_list = [to_bitset(row) for row in causal_matrix]
+    pred_bitset_list = [to_bitset(row) for row in causal_matrix.T]
+    unrelated_bitset_list = [to_bitset(row) for row in unrelated_matrix]
+    all_bitset = (1 << len(task_list)) - 1
+
+    first_task_set: Set[str] = {
+        task_list[i] for i in np.flatnonzero(~direct_matrix.any(axis=0))
+    }
 
     # print(first_task_set)
 
-    last_task_set: Set[str] = copy(task_set)
-    for pred_task in dependency_graph.keys():
-        if pred_task in last_task_set:
-            last_task_set.remove(pred_task)
+    last_task_set: Set[str] = {
+        task_list[i] for i in np.flatnonzero(~direct_matrix.any(axis=1))
+    }
 
     # print(last_task_set)
 
-    xw_list: List[Tuple[Set[str], Set[str]]] = []
-
-    for pred_task in dependency_graph.keys():
-        for succ_task in dependency_graph[pred_task].keys():
-            if check_causality(pred_task, succ_task):
-                xw_list.append((set([pred_task]), set([succ_task])))
-
-    def merge_set(
-        xw_list: List[Tuple[Set[str], Set[str]]]
-    ) -> Tuple[bool, List[Tuple[Set[str], Set[str]]]]:
+    def find_max_unrelated_sets(candidate_bitset: int) -> List[int]:
         """
-        only merge two sets at one time
-        return true if merge success
+        maximal sets of pairwise unrelated tasks inside candidate_bitset
+        (Bron-Kerbosch with pivot)
         """
-        nonlocal check_direct_succ
-
-        def check_set_valid(new_set: Set[str]) -> bool:
-            nonlocal check_direct_succ
-            for pred_task in new_set:
-                for succ_task in new_set:
-                    if pred_task == succ_task:
-                        continue
-                    if check_direct_succ(pred_task, succ_task):
-                        return False
-            return True
-
-        result = copy(xw_list)
-        for a_pred_set, a_succ_set in xw_list:
-            for b_pred_set, b_succ_set in xw_list:
-                if a_pred_set == b_pred_set:
-                    if a_succ_set == b_succ_set:
-                        continue
-                    else:
-                        new_succ_set = a_succ_set.union(b_succ_set)
-                        if check_set_valid(new_succ_set):
-                            result.remove((a_pred_set, a_succ_set))
-                            result.remove((b_pred_set, b_succ_set))
-                            result.append((a_pred_set, new_succ_set))
-                            return True, result
-                elif a_succ_set == b_succ_set:
-                    new_pred_set = a_pred_set.union(b_pred_set)
-                    if check_set_valid(new_pred_set):
-                        result.remove((a_pred_set, a_succ_set))
-                        result.remove((b_pred_set, b_succ_set))
-                        result.append((new_pred_set, a_succ_set))
-                        return True, result
-
-        return False, result
-
-    flag, xw_list = merge_set(xw_list)
-    while flag:
-        flag, xw_list = merge_set(xw_list)
+        result: List[int] = []
+        stack = [(0, candidate_bitset, 0)]
+        while stack:
+            clique, candidates, excluded = stack.pop()
+            if candidates == 0:
+                if excluded == 0:
+                    result.append(clique)
+                continue
+            pivot = to_index_list(candidates | excluded)[0]
+            pivot_neighbors = unrelated_bitset_list[pivot] & ~(1 << pivot)
+            for index in to_index_list(candidates & ~pivot_neighbors):
+                bit = 1 << index
+                neighbors = unrelated_bitset_list[index] & ~bit
+                stack.append((clique | bit, candidates & neighbors, excluded & neighbors))
+                candidates &= ~bit
+                excluded |= bit
+        return result
+
+    # maximal (A, B): A and B are sets of unrelated tasks, a -> b for all a, b
+    # A is grown in task index order while the common successors are not empty,
+    # for every A the maximal B are the maximal unrelated sets of the common
+    # successors, and (A, B) is kept if no task can be added to A any more
+    # the excluded tasks (index below next_index, not in A, unrelated to A)
+    # prune like in Bron-Kerbosch: one that precedes all common successors
+    # blocks every B of this A, and if it is also unrelated to all candidates
+    # it can join every A grown from here, so the branch is dropped
+    xw_list: List[Tuple[Set[str], Set[str]]] = []
+    stack = [(0, all_bitset, all_bitset, 0)]
+    while stack:
+        pred_bitset, common_succ_bitset, common_unrelated_bitset, next_index = stack.pop()
+        candidate_list = [
+            index
+            for index in to_index_list(common_unrelated_bitset >> next_index << next_index)
+            if common_succ_bitset & succ_bitset_list[index] != 0
+        ]
+        candidate_bitset = 0
+        for index in candidate_list:
+            candidate_bitset |= 1 << index
+
+        blocked = False
+        pruned = False
+        if pred_bitset != 0:
+            excluded_bitset = (
+                common_unrelated_bitset & ((1 << next_index) - 1) & ~pred_bitset
+            )
+            # the skipped siblings come last in index order, and prune the most
+            for index in reversed(to_index_list(excluded_bitset)):
+                if common_succ_bitset & ~succ_bitset_list[index] == 0:
+                    blocked = True
+                    if candidate_bitset & ~unrelated_bitset_list[index] == 0:
+                        pruned = True
+                        break
+        if pruned:
+            continue
+
+        if pred_bitset != 0 and not blocked:
+            for succ_bitset in find_max_unrelated_sets(common_succ_bitset):
+                common_pred_bitset = all_bitset
+                for succ_index in to_index_list(succ_bitset):
+                    common_pred_bitset &= pred_bitset_list[succ_index]
+                if common_pred_bitset & common_unrelated_bitset & ~pred_bitset == 0:
+                    xw_list.append(
+                        (
+                            {task_list[i] for i in to_index_list(pred_bitset)},
+                            {task_list[i] for i in to_index_list(succ_bitset)},
+                        )
+                    )
+        for k in range(len(candidate_list) - 1, -1, -1):
+            index = candidate_list[k]
+            new_common_succ_bitset = common_succ_bitset & succ_bitset_list[index]
+            new_common_unrelated_bitset = (
+                common_unrelated_bitset & unrelated_bitset_list[index]
+            )
+            if k > 0:
+                # the same pruning with the skipped previous candidate, before the
+                # branch is pushed (wide choices would push a branch per pair)
+                sibling_index = candidate_list[k - 1]
+                if (
+                    new_common_unrelated_bitset >> sibling_index & 1
+                    and new_common_succ_bitset & ~succ_bitset_list[sibling_index] == 0
+                    and new_common_unrelated_bitset
+                    >> (index + 1)
+                    & ~(unrelated_bitset_list[sibling_index] >> (index + 1))
+                    == 0
+                ):
+                    continue
+            stack.append(
+                (
+                    pred_bitset | 1 << index,
+                    new_common_succ_bitset,
+                    new_common_unrelated_bitset,
+                    index + 1,
+                )
+            )
 
     # print(xw_list)
 
@@ -120,7 +187,7 @@ def alpha(log: Dict[str, List[Dict[str, Union[int, str, datetime]]]]) -> PetriNe
 
     id_generator = IdGenerator()
     result_petri_net: PetriNet = PetriNet()
-    for task in task_set:
+    for task in task_list:
         result_petri_net.add_transition(task, id_generator.get_new_id())
 
     for pred_set, succ_set in xw_list:
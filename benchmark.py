@@ -0,0 +1,250 @@
+from __future__ import annotations
+from typing import List, Dict, Tuple, Callable
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from PetriNet import *
+from alpha import alpha
+from heuristic import fitness_token_replay
+from HeuristicMiner import HeuristicMiner, XOR_Relation, parse_depend_matrix
+from Painter import write_dot
+from LogGenerator import LogGenerator
+
+BUNDLED_LOGS = ["extension-log-3.xes", "extension-log-4.xes", "extension-log-noisy-4.xes"]
+STAGES = [
+    "parse",
+    "dependency_graph",
+    "depend_matrix",
+    "xor_extension",
+    "alpha",
+    "fitness",
+    "dot",
+]
+
+
+def write_scaled_log(filename: str, scale: int, output_filename: str) -> None:
+    """
+    write a log made of the traces of filename repeated scale times,
+    the copies get new case ids
+    """
+    with open(filename, encoding="utf-8") as f:
+        text = f.read()
+    first_trace = text.index("<trace")
+    last_trace = text.rindex("</trace>") + len("</trace>")
+    trace_text = text[first_trace:last_trace]
+    case_pattern = re.compile(r'(<trace>\s*<string key="concept:name" value=")([^"]*)"')
+    with open(output_filename, "w", encoding="utf-8") as f:
+        f.write(text[:first_trace])
+        for copy_index in range(scale):
+            f.write(case_pattern.sub(rf'\g<1>\g<2>-{copy_index}"', trace_text))
+            f.write("\n")
+        f.write(text[last_trace:])
+
+
+def get_stage_functions(filename: str) -> Dict[str, Callable[[], object]]:
+    """
+    one function per stage, the input of every stage is prepared once here
+    """
+    log = read_from_file(filename, use_cache=False)
+    miner = HeuristicMiner(0.9605, 0.8, 4200)
+    miner.load_log(log)
+    miner.update_depend_matrix()
+    net = alpha(log)
+
+    def xor_extension() -> int:
+        task_list = list(miner.task_dict.values())
+        parse_depend_matrix(task_list, miner.depend_matrix, miner.depend_threshold)
+        xor_relations = XOR_Relation(miner.task_dict)
+        return xor_relations.extend_relations(
+            miner.xor_threshold, task_list, miner.depend_count_matrix
+        )
+
+    return {
+        "parse": lambda: read_from_file(filename, use_cache=False),
+        "dependency_graph": lambda: dependency_graph_file(log),
+        "depend_matrix": miner.update_depend_matrix,
+        "xor_extension": xor_extension,
+        "alpha": lambda: alpha(log),
+        "fitness": lambda: fitness_token_replay(log, net),
+        "dot": lambda: write_dot(net, io.StringIO()),
+    }
+
+
+def run_stage(
+    function: Callable[[], object], repeat: int, min_batch_seconds: float = 0.05
+) -> Tuple[float, int]:
+    """
+    return (best time of one call in seconds, peak traced memory in bytes)
+    fast stages are called in batches of at least min_batch_seconds,
+    the memory is measured in an extra call, tracemalloc slows the code down
+    """
+    call_num = 1
+    while True:
+        start_time = time.perf_counter()
+        for _ in range(call_num):
+            function()
+        batch_seconds = time.perf_counter() - start_time
+        if batch_seconds >= min_batch_seconds:
+            break
+        call_num *= 10
+    best_seconds = batch_seconds / call_num
+    for _ in range(repeat - 1):
+        start_time = time.perf_counter()
+        for _ in range(call_num):
+            function()
+        best_seconds = min(best_seconds, (time.perf_counter() - start_time) / call_num)
+    tracemalloc.start()
+    function()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best_seconds, peak_memory
+
+
+def run_benchmark(
+    filename_list: List[str], stage_list: List[str] = STAGES, repeat: int = 3
+) -> List[Dict[str, str | int | float]]:
+    result_list: List[Dict[str, str | int | float]] = []
+    for filename in filename_list:
+        event_num = len(read_from_file(filename, use_cache=False).task_codes)
+        stage_functions = get_stage_functions(filename)
+        for stage in stage_list:
+            seconds, peak_memory = run_stage(stage_functions[stage], repeat)
+            result_list.append(
+                {
+                    "log": os.path.basename(filename),
+                    "stage": stage,
+                    "events": event_num,
+                    "seconds": seconds,
+                    "events_per_second": event_num / seconds if seconds > 0 else 0.0,
+                    "peak_memory": peak_memory,
+                }
+            )
+            print(
+                f"{os.path.basename(filename):40} {stage:18} "
+                f"{seconds * 1000:10.2f} ms {result_list[-1]['events_per_second']:14.0f} events/s "
+                f"{peak_memory / 2**20:9.2f} MiB"
+            )
+    return result_list
+
+
+def compare_results(
+    result_list: List[Dict[str, str | int | float]],
+    baseline_list: List[Dict[str, str | int | float]],
+    tolerance: float,
+    min_seconds: float = 0.0005,
+) -> List[str]:
+    """
+    return a message for every (log, stage) that is more than tolerance slower
+    than the baseline (or uses more than tolerance more memory)
+    stages faster than min_seconds in the baseline are too noisy to be compared
+    """
+    baseline_dict = {(x["log"], x["stage"]): x for x in baseline_list}
+    message_list: List[str] = []
+    for result in result_list:
+        baseline = baseline_dict.get((result["log"], result["stage"]))
+        if baseline is None:
+            continue
+        for key in ["seconds", "peak_memory"]:
+            if key == "seconds" and baseline[key] < min_seconds:
+                continue
+            if result[key] > baseline[key] * (1 + tolerance):
+                message_list.append(
+                    f"{result['log']} {result['stage']}: {key} "
+                    f"{baseline[key]:.6g} -> {result[key]:.6g} "
+                    f"({result[key] / baseline[key] - 1:+.1%})"
+                )
+    return message_list
+
+
+# python benchmark.py --output bench.json [--baseline old.json] [--scale 10 100]
+# [--activity 100 1000 --trace 5000 --max-children 4 40]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time every stage of the pipeline")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-seconds", type=float, default=0.0005)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--scale",
+        type=int,
+        nargs="*",
+        default=[10],
+        help="synthetic logs: extension-log-noisy-4.xes repeated scale times",
+    )
+    parser.add_argument(
+        "--activity",
+        type=int,
+        nargs="*",
+        default=[],
+        help="generated logs: LogGenerator models with activity activities",
+    )
+    parser.add_argument("--trace", type=int, default=5000)
+    parser.add_argument(
+        "--max-children",
+        type=int,
+        nargs="*",
+        default=[4],
+        help="generated logs: most branches of a block, e.g. 40 for wide xor splits",
+    )
+    parser.add_argument("--stage", nargs="*", default=STAGES, choices=STAGES)
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        filename_list = list(BUNDLED_LOGS)
+        for scale in args.scale:
+            scaled_filename = os.path.join(temp_dir, f"extension-log-noisy-4-x{scale}.xes")
+            write_scaled_log("extension-log-noisy-4.xes", scale, scaled_filename)
+            filename_list.append(scaled_filename)
+        for activity_num in args.activity:
+            for max_children in args.max_children:
+                generated_filename = os.path.join(
+                    temp_dir,
+                    f"generated-{activity_num}-{args.trace}-w{max_children}.xes",
+                )
+                write_xes(
+                    LogGenerator(
+                        activity_num,
+                        noise_rate=0.05,
+                        max_children=max_children,
+                        pool_size=None,
+                    ).generate_log(args.trace),
+                    generated_filename,
+                )
+                filename_list.append(generated_filename)
+        result_list = run_benchmark(filename_list, args.stage, args.repeat)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "python": sys.version,
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "results": result_list,
+            },
+            f,
+            indent=2,
+        )
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline_list = json.load(f)["results"]
+        message_list = compare_results(
+            result_list, baseline_list, args.tolerance, args.min_seconds
+        )
+        for message in message_list:
+            print(f"regression: {message}")
+        if len(message_list) > 0:
+            sys.exit(1)
@@ -3,396 +3,379 @@ from typing import List, Set, Dict, Union, Tuple
 from datetime import datetime
 import xml.etree.ElementTree as ET
 from copy import copy, deepcopy
-
-
-class Place:
-    def __init__(self, id: int) -> None:
-        self.id = id
-        self.predecessor_id_set: Set[int] = set()
-        self.successor_id_set: Set[int] = set()
-        self.token = 0
-
-
-class Transition:
-    def __init__(self, name: str, id: int) -> None:
-        self.name = name
-        self.id = id
-        self.predecessor_id_set: Set[int] = set()
-        self.successor_id_set: Set[int] = set()
-
-
-class PetriNet:
-    def __init__(self) -> None:
-        self.node_dic: Dict[int, Union[Place, Transition]] = {}
-        self.transition_dict: Dict[str, int] = {}
-
-    def add_place(self, id: int) -> PetriNet:
-        self.node_dic[id] = Place(id)
-
-        return self
-
-    def add_transition(self, name: str, id: int) -> PetriNet:
-        self.node_dic[id] = Transition(name, id)
-        self.transition_dict[name] = id
-        return self
-
-    def transition_name_to_id(self, name: str) -> int:
-        return self.transition_dict[name]
-
-    def add_edge(self, source_id: int, target_id: int) -> PetriNet:
-        self.node_dic[source_id].successor_id_set.add(target_id)
-        self.node_dic[target_id].predecessor_id_set.add(source_id)
-        return self
-
-    def get_tokens(self, place_id: int) -> int:
-        return self.node_dic[place_id].token
-
-    def is_enabled(self, transition_id: int) -> bool:
-        for place_id in self.node_dic[transition_id].predecessor_id_set:
-            if self.node_dic[place_id].token <= 0:
-                return False
-
-        return True
-
-    def add_marking(self, place_id: int) -> PetriNet:
-        self.node_dic[place_id].token += 1
-        return self
-
-    def fire_transition(self, transition_id: int) -> Tuple[int, int, int]:
-        """
-        return a tuple consisting
-        (new_m, new_c, new_p)
-        """
-        new_m = 0
-        new_c = 0
-        new_p = 0
-        for place_id in self.node_dic[transition_id].predecessor_id_set:
-            if self.node_dic[place_id].token <= 0:
-                new_m += 1
-            else:
-                self.node_dic[place_id].token -= 1
-            new_c += 1
-
-        for place_id in self.node_dic[transition_id].successor_id_set:
-            self.node_dic[place_id].token += 1
-            new_p += 1
-
-        return new_m, new_c, new_p
-
-
-def read_from_file(
-    filename: str,
-) -> Dict[str, List[Dict[str, Union[int, str, datetime]]]]:
-    tree = ET.parse(filename)
-    root = tree.getroot()
-    result: Dict[str, List[Dict[str, Union[int, str, datetime]]]] = {}
-
-    def parse_event_attribute(
-        attribute_node: ET.Element,
-    ) -> Tuple[str, Union[str, int, datetime]]:
-        key = attribute_node.attrib["key"]
-        value_str = attribute_node.attrib["value"]
-        match attribute_node.tag:
-            case "{http://www.xes-standard.org/}string":
-                value = value_str
-            case "{http://www.xes-standard.org/}int":
-                value = int(value_str)
-            case "{http://www.xes-standard.org/}date":
-                year_mon_day_str, hour_min_sec_str = value_str.split("T")
-                time_strs = year_mon_day_str.split("-")
-                year = int(time_strs[0])
-                month = int(time_strs[1])
-                day = int(time_strs[2])
-                time_strs = hour_min_sec_str.split(":")
-                hour = int(time_strs[0])
-                minute = int(time_strs[1])
-                value = datetime(year, month, day, hour, minute)
-        return key, value
-
-    for child in root:
-        if child.tag == "{http://www.xes-standard.org/}trace":
-            for node in child:
-                if node.tag == "{http://www.xes-standard.org/}string":
-                    case_id = node.attrib["value"]
-            if case_id not in result.keys():
-                result[case_id] = []
-            for event_node in child:
-                if event_node.tag == "{http://www.xes-standard.org/}event":
-                    event: Dict[str, Union[str, int, datetime]] = {}
-                    for attribute_node in event_node:
-                        key, value = parse_event_attribute(attribute_node)
-                        event[key] = value
-                    result[case_id].append(event)
-
-    return result
-
-
-def dependency_graph_file(
-    log: Dict[str, List[Dict[str, Union[int, str, datetime]]]]
-) -> Dict[str, Dict[str, int]]:
-    result: Dict[str, Dict[str, int]] = {}
-    for case_id in log.keys():
-        trace = log[case_id]
-        for index in range(len(trace) - 1):
-            pred_task = trace[index]["concept:name"]
-            succ_task = trace[index + 1]["concept:name"]
-            if pred_task not in result.keys():
-                result[pred_task] = {succ_task: 1}
-            else:
-                if succ_task not in result[pred_task].keys():
-                    result[pred_task][succ_task] = 1
-                else:
-                    result[pred_task][succ_task] += 1
-
-    return result
-
-
-def alpha(log: Dict[str, List[Dict[str, Union[int, str, datetime]]]]) -> PetriNet:
-    dependency_graph = dependency_graph_file(log)
-
-    for pred in dependency_graph.keys():
-        print(pred)
-        for succ in dependency_graph[pred]:
-            print(f" {succ} {dependency_graph[pred][succ]}")
-        print()
-        
-
-    task_set: Set[str] = set()
-    for pred_task in dependency_graph.keys():
-        if pred_task not in task_set:
-            task_set.add(pred_task)
-        for succ_task in dependency_graph[pred_task].keys():
-            if succ_task not in task_set:
-                task_set.add(succ_task)
-
-    # print(task_set)
-
-    def check_direct_succ(pred_task: str, succ_task: str) -> bool:
-        nonlocal dependency_graph
-        if pred_task not in dependency_graph.keys():
-            return False
-        elif succ_task not in dependency_graph[pred_task].keys():
-            return False
-        else:
-            return True
-
-    def check_causality(pred_task: str, succ_task: str) -> bool:
-        nonlocal check_direct_succ
-        return check_direct_succ(pred_task, succ_task) and not check_direct_succ(
-            succ_task, pred_task
+from array import array
+import io
+import heapq
+from itertools import islice, chain
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PetriNet import *
+from alpha import alpha
+from Painter import write_dot
+
+
+# replay_variants_with_trie falls back to replay_variants when the shared
+# prefixes save less than this many transition firings and arcs per variant
+TRIE_MIN_SHARED_WORK = 40
+
+
+def get_replay_variants(
+    log: Log | ColumnarLog | TraceStream, frozen_model: FrozenPetriNet
+) -> List[Tuple[List[int], int]]:
+    """
+    return [(transition indexes of the variant, number of traces)]
+    """
+    transition_index_dict = frozen_model.transition_index_dict
+    if isinstance(log, ColumnarLog):
+        code_to_index = np.array(
+            [transition_index_dict.get(name, -1) for name in log.task_names] + [-1],
+            dtype=np.int64,
         )
+        rows, variant_offsets = log.get_variant_rows()
+        transition_indexes = code_to_index[log.task_codes[rows]]
+        if np.any(transition_indexes < 0):
+            raise KeyError(
+                log.task_names[log.task_codes[rows[np.argmax(transition_indexes < 0)]]]
+            )
+        return [
+            (
+                transition_indexes[variant_offsets[i] : variant_offsets[i + 1]].tolist(),
+                int(log.variant_counts[i]),
+            )
+            for i in range(len(log.variant_counts))
+        ]
+
+    variant_dict: Dict[Tuple[int, ...], int] = {}
+    for _, trace in iter_traces(log):
+        variant = tuple(transition_index_dict[event["concept:name"]] for event in trace)
+        variant_dict[variant] = variant_dict.get(variant, 0) + 1
+    return list(variant_dict.items())
+
+
+def replay_variants(
+    frozen_model: FrozenPetriNet, variant_list: List[Tuple[List[int], int]]
+) -> Tuple[int, int, int, int]:
+    """
+    return the (m, c, p, r) totals, every variant is replayed once
+    and weighted by its number of traces
+    """
+    m = 0
+    c = 0
+    p = 0
+    r = 0
+    marking = frozen_model.new_marking()
+    for transition_index_list, trace_num in variant_list:
+        new_m, new_c, new_p, new_r = frozen_model.replay(transition_index_list, marking)
+        m += new_m * trace_num
+        c += new_c * trace_num
+        p += new_p * trace_num
+        r += new_r * trace_num
+    return m, c, p, r
+
+
+def get_common_prefix_lengths(variant_list: List[Tuple[List[int], int]]) -> np.ndarray:
+    """
+    return the common prefix length of every two neighbouring variants,
+    the transitions of all the variants are compared at once
+    """
+    variant_num = len(variant_list)
+    lengths = np.array([len(variant) for variant, _ in variant_list], dtype=np.int64)
+    offsets = np.zeros(variant_num + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    transition_indexes = np.fromiter(
+        chain.from_iterable(variant for variant, _ in variant_list),
+        dtype=np.int64,
+        count=int(offsets[-1]),
+    )
+    min_lengths = np.minimum(lengths[:-1], lengths[1:])
+    pair_offsets = np.zeros(variant_num, dtype=np.int64)
+    np.cumsum(min_lengths, out=pair_offsets[1:])
+    # pair k compares the positions 0..min_lengths[k] of the variants k and k + 1
+    pair_indexes = np.repeat(np.arange(variant_num - 1), min_lengths)
+    positions = np.arange(pair_offsets[-1]) - pair_offsets[pair_indexes]
+    first_indexes = offsets[pair_indexes] + positions
+    differ = (
+        transition_indexes[first_indexes]
+        != transition_indexes[first_indexes + lengths[pair_indexes]]
+    )
+    prefix_lengths = min_lengths.copy()
+    compared = min_lengths > 0
+    if np.any(compared):
+        prefix_lengths[compared] = np.minimum.reduceat(
+            np.where(differ, positions, min_lengths[pair_indexes]),
+            pair_offsets[:-1][compared],
+        )
+    return prefix_lengths
+
+
+def replay_variants_with_trie(
+    frozen_model: FrozenPetriNet,
+    variant_list: List[Tuple[List[int], int]],
+    max_cached_node_num: int = 1024,
+) -> Tuple[int, int, int, int]:
+    """
+    same result as replay_variants, the shared prefixes are fired once:
+    in sorted order, neighbouring variants are neighbouring leaves of the prefix
+    trie, so a variant is replayed from the cached state (marking and partial
+    m, c, p) at the depth where it leaves the previous variant
+    the cached states lie on the path of the current variant, in a stack
+    at most max_cached_node_num states are cached, the one shared by the fewest
+    traces is evicted (an evicted prefix is replayed again from a shallower state)
+    any order gives the same result, sorted variants share the most
+    with little shared work (see TRIE_MIN_SHARED_WORK) the variants are replayed
+    by replay_variants
+    """
+    variant_num = len(variant_list)
+    if variant_num == 0:
+        return 0, 0, 0, 0
+
+    # prefix_lengths[i]: common prefix length of the variants i and i + 1
+    prefix_lengths = get_common_prefix_lengths(variant_list).tolist()
+    arc_num = sum(map(len, frozen_model.input_place_lists)) + sum(
+        map(len, frozen_model.output_place_lists)
+    )
+    transition_num = max(len(frozen_model.input_place_lists), 1)
+    if (
+        sum(prefix_lengths) * (1 + arc_num / transition_num)
+        < TRIE_MIN_SHARED_WORK * variant_num
+    ):
+        # too little is shared to pay for restoring and caching the states
+        return replay_variants(frozen_model, variant_list)
+    prefix_lengths.append(0)
+    # next_shorter[i]: first k > i with prefix_lengths[k] < prefix_lengths[i],
+    # the variants i..next_shorter[i] share the prefix of length prefix_lengths[i]
+    next_shorter = [variant_num - 1] * variant_num
+    index_stack: List[int] = []
+    for i, prefix_length in enumerate(prefix_lengths):
+        while len(index_stack) > 0 and prefix_lengths[index_stack[-1]] > prefix_length:
+            next_shorter[index_stack.pop()] = i
+        index_stack.append(i)
+    trace_num_sums = [0]
+    for _, trace_num in variant_list:
+        trace_num_sums.append(trace_num_sums[-1] + trace_num)
+
+    input_place_lists = frozen_model.input_place_lists
+    output_place_lists = frozen_model.output_place_lists
+    end_place_list = frozen_model.sink_place_list
+    marking = frozen_model.new_marking()
+    # cached states [depth, marking, m, c, p] by increasing depth,
+    # the root state is never evicted, the others are also kept in a heap
+    # of (number of traces sharing the state, push order, state)
+    root_state = [0, array("q", marking), 0, 0, frozen_model.initial_token_num]
+    state_stack: List[list] = [root_state]
+    state_heap: List[Tuple[int, int, list]] = []
+    cached_num = 0
+    push_num = 0
+    total_m = 0
+    total_c = 0
+    total_p = 0
+    total_r = 0
+
+    for i, (transition_index_list, trace_num) in enumerate(variant_list):
+        # the deepest cached state on the common prefix with the previous variant
+        prefix_length = prefix_lengths[i - 1] if i > 0 else 0
+        while state_stack[-1][0] > prefix_length:
+            state = state_stack.pop()
+            state[1] = None
+            cached_num -= 1
+        depth, cached_marking, m, c, p = state_stack[-1]
+        marking[:] = cached_marking
+
+        # the depths where the following variants leave this one,
+        # deeper than the restored state
+        push_list: List[Tuple[int, int]] = []
+        k = i
+        while prefix_lengths[k] > depth:
+            push_list.append(
+                (prefix_lengths[k], trace_num_sums[next_shorter[k] + 1] - trace_num_sums[i])
+            )
+            k = next_shorter[k]
+        push_list.reverse()
+        push_list.append((len(transition_index_list), -1))
+
+        for push_depth, shared_trace_num in push_list:
+            if shared_trace_num >= 0 and cached_num >= max_cached_node_num:
+                # evict the least used state, unless it is used more than this one
+                if cached_num == 0:
+                    continue
+                while state_heap[0][2][1] is None:
+                    heapq.heappop(state_heap)
+                if state_heap[0][0] >= shared_trace_num:
+                    continue
+                least_used_state = heapq.heappop(state_heap)[2]
+                least_used_state[1] = None
+                cached_num -= 1
+                for j in range(len(state_stack) - 1, 0, -1):
+                    if state_stack[j] is least_used_state:
+                        del state_stack[j]
+                        break
+
+            for transition_index in islice(transition_index_list, depth, push_depth):
+                input_place_list = input_place_lists[transition_index]
+                for place_index in input_place_list:
+                    if marking[place_index] <= 0:
+                        m += 1
+                    else:
+                        marking[place_index] -= 1
+                c += len(input_place_list)
+                output_place_list = output_place_lists[transition_index]
+                for place_index in output_place_list:
+                    marking[place_index] += 1
+                p += len(output_place_list)
+            depth = push_depth
+            if shared_trace_num < 0:
+                break
+
+            state = [depth, array("q", marking), m, c, p]
+            state_stack.append(state)
+            heapq.heappush(state_heap, (shared_trace_num, push_num, state))
+            push_num += 1
+            cached_num += 1
+            if len(state_heap) > 2 * cached_num + 1024:
+                # drop the states that left the stack
+                state_heap = [x for x in state_heap if x[2][1] is not None]
+                heapq.heapify(state_heap)
+
+        end_m = 0
+        # a token is only consumed from a marked place, no count is negative
+        end_r = sum(marking)
+        for place_index in end_place_list:
+            if marking[place_index] <= 0:
+                end_m += 1
+            else:
+                end_r -= 1
+        total_m += (m + end_m) * trace_num
+        total_c += (c + len(end_place_list)) * trace_num
+        total_p += p * trace_num
+        total_r += end_r * trace_num
 
-    first_task_set: Set[str] = copy(task_set)
-    for pred_task in dependency_graph.keys():
-        for succ_task in dependency_graph[pred_task].keys():
-            if succ_task in first_task_set:
-                first_task_set.remove(succ_task)
+    return total_m, total_c, total_p, total_r
 
-    # print(first_task_set)
 
-    last_task_set: Set[str] = copy(task_set)
-    for pred_task in dependency_graph.keys():
-        if pred_task in last_task_set:
-            last_task_set.remove(pred_task)
+# the model of a replay worker process, set once by init_replay_worker
+worker_model: FrozenPetriNet | None = None
+worker_trie_cache_size = 0
 
-    # print(last_task_set)
 
-    xw_list: List[Tuple[Set[str], Set[str]]] = []
+def init_replay_worker(frozen_model: FrozenPetriNet, trie_cache_size: int) -> None:
+    global worker_model
+    global worker_trie_cache_size
+    worker_model = frozen_model
+    worker_trie_cache_size = trie_cache_size
 
-    for pred_task in dependency_graph.keys():
-        for succ_task in dependency_graph[pred_task].keys():
-            if check_causality(pred_task, succ_task):
-                xw_list.append((set([pred_task]), set([succ_task])))
 
-    def merge_set(
-        xw_list: List[Tuple[Set[str], Set[str]]]
-    ) -> Tuple[bool, List[Tuple[Set[str], Set[str]]]]:
-        """
-        only merge two sets at one time
-        return true if merge success
-        """
-        nonlocal check_direct_succ
-
-        def check_set_valid(new_set: Set[str]) -> bool:
-            nonlocal check_direct_succ
-            for pred_task in new_set:
-                for succ_task in new_set:
-                    if pred_task == succ_task:
-                        continue
-                    if check_direct_succ(pred_task, succ_task):
-                        return False
-            return True
-
-        result = copy(xw_list)
-        for a_pred_set, a_succ_set in xw_list:
-            for b_pred_set, b_succ_set in xw_list:
-                if a_pred_set == b_pred_set:
-                    if a_succ_set == b_succ_set:
-                        continue
-                    else:
-                        new_succ_set = a_succ_set.union(b_succ_set)
-                        if check_set_valid(new_succ_set):
-                            result.remove((a_pred_set, a_succ_set))
-                            result.remove((b_pred_set, b_succ_set))
-                            result.append((a_pred_set, new_succ_set))
-                            return True, result
-                elif a_succ_set == b_succ_set:
-                    new_pred_set = a_pred_set.union(b_pred_set)
-                    if check_set_valid(new_pred_set):
-                        result.remove((a_pred_set, a_succ_set))
-                        result.remove((b_pred_set, b_succ_set))
-                        result.append((new_pred_set, a_succ_set))
-                        return True, result
-
-        return False, result
-
-    flag, xw_list = merge_set(xw_list)
-    while flag:
-        flag, xw_list = merge_set(xw_list)
-
-    # print(xw_list)
-
-    class IdGenerator:
-        def __init__(self) -> None:
-            self.id = 0
-
-        def get_new_id(self) -> int:
-            self.id += 1
-            return self.id
-
-    id_generator = IdGenerator()
-    result_petri_net: PetriNet = PetriNet()
-    for task in task_set:
-        result_petri_net.add_transition(task, id_generator.get_new_id())
-
-    for pred_set, succ_set in xw_list:
-        place_id = id_generator.get_new_id()
-        result_petri_net.add_place(place_id)
-        for pred_name in pred_set:
-            pred_id = result_petri_net.transition_name_to_id(pred_name)
-            result_petri_net.add_edge(pred_id, place_id)
-        for succ_name in succ_set:
-            succ_id = result_petri_net.transition_name_to_id(succ_name)
-            result_petri_net.add_edge(place_id, succ_id)
-
-    for last_name in last_task_set:
-        place_id = id_generator.get_new_id()
-        result_petri_net.add_place(place_id)
-        last_id = result_petri_net.transition_name_to_id(last_name)
-        result_petri_net.add_edge(last_id, place_id)
-
-    for first_name in first_task_set:
-        place_id = id_generator.get_new_id()
-        result_petri_net.add_place(place_id)
-        first_id = result_petri_net.transition_name_to_id(first_name)
-        result_petri_net.add_edge(place_id, first_id)
-        result_petri_net.add_marking(place_id)
-
-    # for pred_task in dependency_graph.keys():
-    #     for succ_task in dependency_graph[pred_task].keys():
-    #         print(
-    #             f"{pred_task} -> {succ_task}: {dependency_graph[pred_task][succ_task]}"
-    #         )
-
-    # print("tasks:")
-    # for task in task_set:
-    #     print(task)
-
-    # for pred_set, succ_set in xw_list:
-    #     print(pred_set, succ_set)
-
-    # print(len(first_task_set))
-    # print(len(last_task_set))
-
-    return result_petri_net
+def replay_shard(variant_list: List[Tuple[List[int], int]]) -> Tuple[int, int, int, int]:
+    if worker_trie_cache_size > 0:
+        return replay_variants_with_trie(
+            worker_model, variant_list, worker_trie_cache_size
+        )
+    return replay_variants(worker_model, variant_list)
 
 
 def fitness_token_replay(
-    log: Dict[str, List[Dict[str, Union[int, str, datetime]]]], model: PetriNet
+    log: Log | ColumnarLog | TraceStream,
+    model: PetriNet,
+    process_num: int = 1,
+    chunk_size: int = 256,
+    trie_cache_size: int = 0,
 ) -> float:
-    def get_remained_token_num(model: PetriNet) -> int:
-        remained_token_num = 0
+    """
+    process_num > 1: the model is sent to every worker process once,
+    the variants are replayed in shards of chunk_size and the counters are added up
+    trie_cache_size > 0: the shared prefixes are replayed once
+    (see replay_variants_with_trie), with at most trie_cache_size cached markings
+    """
+    frozen_model = model.freeze()
+    variant_list = get_replay_variants(log, frozen_model)
+    if trie_cache_size > 0:
+        # neighbouring variants share prefixes, also inside a shard
+        variant_list.sort()
+
+    if process_num <= 1 or len(variant_list) <= chunk_size:
+        init_replay_worker(frozen_model, trie_cache_size)
+        m, c, p, r = replay_shard(variant_list)
+    else:
+        m = c = p = r = 0
+        with ProcessPoolExecutor(
+            process_num,
+            initializer=init_replay_worker,
+            initargs=(frozen_model, trie_cache_size),
+        ) as executor:
+            for new_m, new_c, new_p, new_r in executor.map(
+                replay_shard,
+                [
+                    variant_list[i : i + chunk_size]
+                    for i in range(0, len(variant_list), chunk_size)
+                ],
+            ):
+                m += new_m
+                c += new_c
+                p += new_p
+                r += new_r
 
-        for id in model.node_dic.keys():
-            node = model.node_dic[id]
-            if isinstance(node, Place):
-                if node.token > 0:
-                    remained_token_num += node.token
+    # print(m, c, p, r)
 
-        return remained_token_num
+    return get_fitness(m, c, p, r)
 
-    def consume_end_token(model: PetriNet) -> Tuple[int, int]:
-        """
-        return (new_m, new_c)
-        """
-        new_m = 0
-        new_c = 0
 
-        for id in model.node_dic.keys():
-            node = model.node_dic[id]
-            if isinstance(node, Place) and len(node.successor_id_set) == 0:
-                new_c += 1
-                if node.token <= 0:
-                    new_m += 1
-                else:
-                    node.token -= 1
+def get_fitness(m: int, c: int, p: int, r: int) -> float:
+    return 0.5 * (1 - m / c) + 0.5 * (1 - r / p)
 
-        return new_m, new_c
 
-    m = 0.0
-    r = 0.0
-    c = 0.0
-    p = 0.0
+# the variants shared by the models of a model worker process
+worker_variant_list: List[Tuple[List[int], int]] = []
 
-    for trace_id in log.keys():
-        tmp_model = deepcopy(model)
 
-        p += get_remained_token_num(tmp_model)
+def init_model_worker(variant_list: List[Tuple[List[int], int]]) -> None:
+    global worker_variant_list
+    worker_variant_list = variant_list
 
-        for event in log[trace_id]:
-            new_m, new_c, new_p = tmp_model.fire_transition(
-                tmp_model.transition_name_to_id(event["concept:name"])
-            )
-            m += new_m
-            c += new_c
-            p += new_p
 
-        new_m, new_c = consume_end_token(tmp_model)
-        m += new_m
-        c += new_c
-        r += get_remained_token_num(tmp_model)
+def replay_model(frozen_model: FrozenPetriNet) -> Tuple[int, int, int, int]:
+    return replay_variants(frozen_model, worker_variant_list)
 
-    # print(m, c, p, r)
 
-    return 0.5 * (1 - m / c) + 0.5 * (1 - r / p)
+def fitness_token_replay_models(
+    log: Log | ColumnarLog, models: List[PetriNet], process_num: int = 1
+) -> List[float]:
+    """
+    fitness_token_replay of every model, the models must have the same transitions
+    in the same order (e.g. the nets of a threshold sweep):
+    the variants are built once, sent to every worker process once,
+    and the models are replayed in parallel
+    """
+    frozen_models = [model.freeze() for model in models]
+    if len(frozen_models) == 0:
+        return []
+    transition_names = frozen_models[0].transition_names
+    for frozen_model in frozen_models:
+        if frozen_model.transition_names != transition_names:
+            raise ValueError("the models have different transitions")
+    variant_list = get_replay_variants(log, frozen_models[0])
+
+    if process_num <= 1 or len(frozen_models) == 1:
+        init_model_worker(variant_list)
+        counts_list = [replay_model(frozen_model) for frozen_model in frozen_models]
+    else:
+        with ProcessPoolExecutor(
+            process_num, initializer=init_model_worker, initargs=(variant_list,)
+        ) as executor:
+            counts_list = list(executor.map(replay_model, frozen_models))
+    return [get_fitness(*counts) for counts in counts_list]
 
 
 class Painter:
     def __init__(self) -> None:
         self.dot_code = ""
 
-    def generate_dot_code(self, petriNet: PetriNet) -> None:
+    def generate_dot_code(self, petriNet: PetriNet | FrozenPetriNet) -> None:
         """
         generate the dot code
         save the code into './result.dot'
         """
-        self.dot_code = "digraph SourceGra {\n"
-
-        for id in petriNet.node_dic.keys():
-            node = petriNet.node_dic[id]
-            if isinstance(node, Place):
-                self.dot_code += f'x{id} [shape = circle label=" "];\n'
-            elif isinstance(node, Transition):
-                self.dot_code += f'x{id} [shape = box label="{node.name}"];\n'
-            else:
-                raise Exception
-
-        for id in petriNet.node_dic.keys():
-            node = petriNet.node_dic[id]
-            for succ_id in node.successor_id_set:
-                self.dot_code += f"x{id} -> x{succ_id};\n"
-
-        self.dot_code += "}"
+        buffer = io.StringIO()
+        write_dot(petriNet, buffer, place_label=" ")
+        self.dot_code = buffer.getvalue()
 
         dot_file_path = "./result.dot"
         with open(dot_file_path, "w") as f: